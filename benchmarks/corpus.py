@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+
+import os
+import random
+
+# fixed vocabulary so that generated corpora only depend on the seed
+VOCABULARY = ("data vector index embedding chroma query document chunk token model server cluster "
+              "network storage memory latency throughput request response batch pipeline cache shard "
+              "replica volume kernel process thread queue socket buffer record table column schema "
+              "search recall ranking score distance cosine metric window split sentence paragraph "
+              "section chapter manual guide install configure deploy upgrade rollback backup restore").split()
+
+
+def _sentence(rng: random.Random) -> str:
+    words = [rng.choice(VOCABULARY) for _ in range(rng.randint(6, 20))]
+    return " ".join(words).capitalize() + "."
+
+
+def _text(rng: random.Random, words: int) -> str:
+    paragraphs, current, count = [], [], 0
+    while count < words:
+        sentence = _sentence(rng)
+        current.append(sentence)
+        count += len(sentence.split())
+        if len(current) >= rng.randint(3, 8):
+            paragraphs.append(" ".join(current))
+            current = []
+    if len(current) > 0:
+        paragraphs.append(" ".join(current))
+    return "\n\n".join(paragraphs)
+
+
+# document length in words drawn from the requested distribution
+def _length(rng: random.Random, distribution: str, mean_words: int) -> int:
+    if distribution == "fixed":
+        return mean_words
+    elif distribution == "uniform":
+        return rng.randint(max(mean_words // 4, 1), mean_words * 2 - mean_words // 4)
+    elif distribution == "lognormal":
+        # mu chosen so that the distribution mean is mean_words
+        sigma = 0.8
+        return max(int(rng.lognormvariate(0, sigma) * mean_words / 1.377), 10)
+    else:
+        raise ValueError(f"corpus: unsupported length distribution {distribution}")
+
+
+# minimal single-font pdf writer, one page per ~45 lines of text
+def write_pdf(path: str, text: str, line_width: int = 90, lines_per_page: int = 45):
+    lines = []
+    for paragraph in text.split("\n\n"):
+        words, line = paragraph.split(), ""
+        for word in words:
+            if len(line) + len(word) + 1 > line_width:
+                lines.append(line)
+                line = word
+            else:
+                line = f"{line} {word}".strip()
+        lines.append(line)
+        lines.append("")
+    pages = [lines[k:k+lines_per_page] for k in range(0, len(lines), lines_per_page)] or [[""]]
+
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for page in pages:
+        escaped = [l.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") for l in page]
+        stream = "BT /F1 10 Tf 12 TL 40 800 Td " + " ".join(f"({l}) '" for l in escaped) + " ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>")
+        page_ids.append(len(objects))
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(f'{i} 0 R' for i in page_ids)}] /Count {len(page_ids)} >>"
+
+    body, offsets = "%PDF-1.4\n", []
+    for n, obj in enumerate(objects, start=1):
+        offsets.append(len(body.encode("latin-1")))
+        body += f"{n} 0 obj\n{obj}\nendobj\n"
+    xref = len(body.encode("latin-1"))
+    body += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n"
+    body += "".join(f"{o:010d} 00000 n \n" for o in offsets)
+    body += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n"
+    with open(path, "wb") as f:
+        f.write(body.encode("latin-1"))
+
+
+# generate a synthetic corpus, returns the list of generated files
+def generate_corpus(path: str, documents: int = 100, mean_words: int = 500,
+                    distribution: str = "lognormal", pdf_ratio: float = 0.0,
+                    duplicate_ratio: float = 0.0, seed: int = 42) -> list:
+    rng = random.Random(seed)
+    os.makedirs(path, exist_ok=True)
+    files, texts = [], []
+    for n in range(documents):
+        # optionally reuse the text of a previous document (boilerplate copies)
+        if len(texts) > 0 and rng.random() < duplicate_ratio:
+            text = rng.choice(texts)
+        else:
+            text = _text(rng, _length(rng, distribution, mean_words))
+            texts.append(text)
+        subdir = os.path.join(path, f"d{n % 10}")
+        os.makedirs(subdir, exist_ok=True)
+        if rng.random() < pdf_ratio:
+            filename = os.path.join(subdir, f"doc{n:06d}.pdf")
+            write_pdf(filename, text)
+        else:
+            filename = os.path.join(subdir, f"doc{n:06d}.txt")
+            with open(filename, "w") as f:
+                f.write(text)
+        files.append(filename)
+    return files
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+
+import re
+from time import sleep
+from zlib import crc32
+from hashlib import blake2b
+from typing import List
+from numpy import frombuffer, uint8, float32, zeros, linalg
+from llama_index.core.base.embeddings.base import BaseEmbedding
+
+
+# deterministic embedding model: vectors are derived from a hash of the text,
+# an optional per-call latency simulates a remote embedding endpoint
+class FakeEmbedding(BaseEmbedding):
+    dimensions: int = 384
+    latency: float = 0.0
+    calls: int = 0
+    texts: int = 0
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "FakeEmbedding"
+
+    def _vector(self, text: str) -> List[float]:
+        digest = b""
+        counter = 0
+        while len(digest) < self.dimensions:
+            digest += blake2b(f"{counter}:{text}".encode("utf-8"), digest_size=64).digest()
+            counter += 1
+        vector = frombuffer(digest[:self.dimensions], dtype=uint8).astype(float32) / 255.0 - 0.5
+        return vector.tolist()
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        self.texts += len(texts)
+        if self.latency > 0:
+            sleep(self.latency)
+        return [self._vector(t) for t in texts]
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._get_text_embeddings([text])[0]
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._vector(query)
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return self._vector(query)
+
+
+# lexical embedding model for retrieval benchmarks: hashed unigram and bigram counts,
+# L2-normalized, so that texts sharing words and phrases get close vectors
+class BagOfWordsEmbedding(FakeEmbedding):
+    @classmethod
+    def class_name(cls) -> str:
+        return "BagOfWordsEmbedding"
+
+    def _vector(self, text: str) -> List[float]:
+        words = re.findall(r"\w+", text.lower())
+        vector = zeros(self.dimensions, dtype=float32)
+        for term in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+            h = crc32(term.encode("utf-8"))
+            vector[h % self.dimensions] += 1.0 if (h >> 31) == 0 else -1.0
+        norm = linalg.norm(vector)
+        return (vector / norm if norm > 0 else vector).tolist()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+
+# ChromaDB Ingestor splitter comparison
+#
+# ingests the same synthetic corpus once per splitter with a lexical bag of words
+# embedding model, then queries the collection with sentences sampled from the
+# corpus and reports ingestion throughput and retrieval quality as JSON:
+#   hit_at_k:        a top-k chunk contains the whole query sentence
+#   source_hit_at_k: a top-k chunk comes from the file the sentence was sampled from
+#   mrr:             mean reciprocal rank of the first chunk containing the sentence
+#
+# usage: python -m benchmarks.retrieval --documents 100 --splitters semantic,token,character --chunk-size 256
+
+import os
+import re
+import json
+import random
+import argparse
+import platform
+import tempfile
+import multiprocessing
+from time import perf_counter
+from benchmarks.run import git_revision, peak_rss_mb, splitter_options
+
+SPLITTERS = ("semantic", "semantic_reuse", "token", "character")
+
+
+# deterministic query sample: (file, sentence) pairs drawn from the text files of the corpus
+def sample_queries(corpus_path: str, queries: int, seed: int) -> list:
+    files = sorted(os.path.join(d, f) for d, _, names in os.walk(corpus_path) for f in names if f.endswith(".txt"))
+    rng = random.Random(seed)
+    sample = []
+    for path in rng.sample(files, min(queries, len(files))) if len(files) > 0 else []:
+        with open(path) as f:
+            sentences = re.findall(r"[A-Z][^.]*\.", f.read())
+        if len(sentences) > 0:
+            sample.append((path, rng.choice(sentences)))
+    return sample
+
+
+# ingest the corpus with one splitter and run the queries, in a fresh process
+def run_splitter(splitter: str, corpus_path: str, queries: list, options: dict) -> dict:
+    from contextlib import redirect_stdout
+    from libs.chroma.client import LlamaIndexChroma
+    from libs.utils.metrics import configure
+    from benchmarks.fake_embedding import BagOfWordsEmbedding
+
+    metrics = configure(enabled=True)
+    embedder = BagOfWordsEmbedding(dimensions=options["dimensions"])
+    ingestor = LlamaIndexChroma(persistence_directory=tempfile.mkdtemp(prefix="bench-chroma-"),
+                                collection="retrieval",
+                                collection_similarity="cosine",
+                                embedding_function=embedder)
+
+    started = perf_counter()
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        ingestor.GenerateEmbeddings(training_data_path=corpus_path,
+                                    pattern=[".txt"],
+                                    show_progress=False,
+                                    splitter=splitter,
+                                    splitter_options=splitter_options({**options, "splitter": splitter}))
+    elapsed = perf_counter() - started
+    ingest_calls, ingest_texts = embedder.calls, embedder.texts
+
+    collection = ingestor.Collection()
+    k = options["k"]
+    hits, source_hits, reciprocal_ranks = 0, 0, 0.0
+    started = perf_counter()
+    for path, sentence in queries:
+        result = collection.query(query_embeddings=[embedder.get_query_embedding(sentence)],
+                                  n_results=k, include=["documents", "metadatas"])
+        documents, metadatas = result["documents"][0], result["metadatas"][0]
+        ranks = [r for r, document in enumerate(documents, start=1) if sentence in document]
+        hits += 1 if len(ranks) > 0 else 0
+        reciprocal_ranks += 1.0 / ranks[0] if len(ranks) > 0 else 0.0
+        source_hits += 1 if any(m.get("file_path") == path for m in metadatas) else 0
+    query_seconds = perf_counter() - started
+
+    nodes = collection.count()
+    stages = metrics.snapshot()["stages"]
+    count = max(len(queries), 1)
+    return {"splitter": splitter,
+            "seconds": elapsed,
+            "split_seconds": stages.get("split", {}).get("seconds", 0.0),
+            "nodes": nodes,
+            "nodes_per_second": nodes / elapsed if elapsed > 0 else 0.0,
+            "mean_chunk_characters": sum(len(d) for d in collection.get(include=["documents"])["documents"]) / max(nodes, 1),
+            "embedding_calls": ingest_calls,
+            "embedded_texts": ingest_texts,
+            "queries": len(queries),
+            "hit_at_k": hits / count,
+            "source_hit_at_k": source_hits / count,
+            "mrr": reciprocal_ranks / count,
+            "query_seconds": query_seconds,
+            "peak_rss_mb": peak_rss_mb()}
+
+
+def _child(splitter: str, corpus_path: str, queries: list, options: dict, results):
+    try:
+        results.put(run_splitter(splitter, corpus_path, queries, options))
+    except Exception as e:
+        results.put({"splitter": splitter, "error": repr(e)})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="ChromaDB Ingestor Retrieval Benchmarks",
+                                     description="Splitter throughput and retrieval quality on a synthetic corpus")
+    parser.add_argument("--documents", type=int, default=100)
+    parser.add_argument("--mean-words", type=int, default=500)
+    parser.add_argument("--distribution", choices=("fixed", "uniform", "lognormal"), default="lognormal")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--splitters", default="semantic,token,character")
+    parser.add_argument("--chunk-size", type=int, default=256)
+    parser.add_argument("--chunk-overlap", type=int, default=32)
+    parser.add_argument("--separator", default="\n\n")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--dimensions", type=int, default=1024)
+    parser.add_argument("--corpus", default=None, help="reuse an existing corpus directory")
+    parser.add_argument("-o", "--output", default=None, help="write the JSON report to this file")
+    arguments = parser.parse_args()
+
+    options = {"chunk_size": arguments.chunk_size,
+               "chunk_overlap": arguments.chunk_overlap,
+               "separator": arguments.separator,
+               "k": arguments.k,
+               "dimensions": arguments.dimensions}
+    corpus = {"documents": arguments.documents,
+              "mean_words": arguments.mean_words,
+              "distribution": arguments.distribution,
+              "seed": arguments.seed}
+
+    corpus_path = arguments.corpus
+    if corpus_path is None:
+        from benchmarks.corpus import generate_corpus
+        corpus_path = tempfile.mkdtemp(prefix="bench-corpus-")
+        generate_corpus(corpus_path, **corpus)
+    corpus["path"] = corpus_path
+    queries = sample_queries(corpus_path, arguments.queries, arguments.seed)
+
+    # every splitter runs in a fresh interpreter
+    context = multiprocessing.get_context("spawn")
+    results = []
+    for splitter in arguments.splitters.split(","):
+        if splitter not in SPLITTERS:
+            raise SystemExit(f"unsupported splitter {splitter}, expected one of {', '.join(SPLITTERS)}")
+        queue = context.Queue()
+        process = context.Process(target=_child, args=(splitter, corpus_path, queries, options, queue))
+        process.start()
+        results.append(queue.get())
+        process.join()
+
+    report = {"revision": git_revision(),
+              "python": platform.python_version(),
+              "platform": platform.platform(),
+              "cpus": os.cpu_count(),
+              "corpus": corpus,
+              "options": options,
+              "results": results}
+    output = json.dumps(report, indent=2)
+    if arguments.output is not None:
+        with open(arguments.output, "w") as f:
+            f.write(output)
+    print(output)
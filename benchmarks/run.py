@@ -0,0 +1,229 @@
+#!/usr/bin/env python
+
+# ChromaDB Ingestor benchmark suite
+#
+# generates a synthetic corpus, runs the GenerateEmbeddings paths against a
+# temporary PersistentClient with a deterministic fake embedding model and
+# reports throughput, peak RSS and per-stage timings as JSON.
+#
+# usage: python -m benchmarks.run --documents 200 --modes sequential,streaming,pipelined
+#        python -m benchmarks.run --splitter token --chunk-size 256 --chunk-overlap 32
+
+import os
+import sys
+import json
+import argparse
+import platform
+import resource
+import tempfile
+import subprocess
+import multiprocessing
+from queue import Empty
+from time import perf_counter
+
+MODES = ("sequential", "streaming", "pipelined")
+EMBEDDINGS = ("fake", "bow")
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is reported in kilobytes on linux, bytes on macos
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+
+# run one ingestion mode, meant to be executed in a fresh process so that peak RSS is per mode
+def run_mode(mode: str, corpus_path: str, options: dict) -> dict:
+    from contextlib import redirect_stdout
+
+    # cold import time of the ingestion stack, every mode runs in a fresh interpreter
+    started = perf_counter()
+    from libs.chroma.client import LlamaIndexChroma
+    from libs.utils.metrics import configure
+    from libs.chroma.dedup import NodeDeduplicator
+    from benchmarks.fake_embedding import FakeEmbedding, BagOfWordsEmbedding
+    import_seconds = perf_counter() - started
+
+    metrics = configure(enabled=True)
+
+    model = BagOfWordsEmbedding if options.get("embedding") == "bow" else FakeEmbedding
+    embedder = model(dimensions=options["dimensions"], latency=options["latency"])
+    persist_dir = tempfile.mkdtemp(prefix="bench-chroma-")
+    ingestor = LlamaIndexChroma(persistence_directory=persist_dir,
+                                collection="benchmark",
+                                collection_similarity="cosine",
+                                embedding_function=embedder)
+    arguments = {"training_data_path": corpus_path,
+                 "pattern": [".txt", ".pdf"],
+                 "show_progress": False,
+                 "batches": options["batches"],
+                 "splitter": options["splitter"],
+                 "splitter_options": splitter_options(options)}
+    if options.get("dedup_threshold"):
+        arguments["dedup"] = NodeDeduplicator(threshold=options["dedup_threshold"])
+    if mode == "streaming":
+        arguments["window_size"] = options["window_size"]
+    elif mode == "pipelined":
+        arguments["window_size"] = options["window_size"]
+        arguments["pipeline_workers"] = options["workers"]
+
+    started = perf_counter()
+    # the ingestor is chatty, keep the benchmark output clean
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        ingestor.GenerateEmbeddings(**arguments)
+    elapsed = perf_counter() - started
+
+    nodes = ingestor.Collection().count()
+    snapshot = metrics.snapshot()
+    return {"mode": mode,
+            "seconds": elapsed,
+            "import_seconds": import_seconds,
+            "nodes": nodes,
+            "nodes_per_second": nodes / elapsed if elapsed > 0 else 0.0,
+            "embedding_calls": embedder.calls,
+            "embedded_texts": embedder.texts,
+            # chunk embeddings taken from the semantic_reuse splitter instead of the model
+            "reused_embeddings": snapshot["counters"].get("reused_embeddings", 0),
+            "peak_rss_mb": peak_rss_mb(),
+            "dedup": arguments["dedup"].report() if "dedup" in arguments else None,
+            "stage_seconds": {stage: values["seconds"] for stage, values in snapshot["stages"].items()},
+            "counters": snapshot["counters"],
+            "histograms": snapshot["histograms"]}
+
+
+# chunking options of the fixed size splitters and embedding reuse of semantic_reuse
+def splitter_options(options: dict) -> dict:
+    if options["splitter"] in ("token", "character"):
+        return {"chunk_size": options["chunk_size"],
+                "chunk_overlap": options["chunk_overlap"],
+                "separator": options["separator"]}
+    elif options["splitter"] == "semantic_reuse":
+        return {"embedding_mode": options["embedding_mode"],
+                "reembed_threshold": options["reembed_threshold"]}
+    return {}
+
+
+# wall time of `main.py --help`, i.e. interpreter startup plus the imports of the CLI entry point
+def cli_startup_seconds() -> float:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    started = perf_counter()
+    subprocess.run([sys.executable, os.path.join(root, "main.py"), "--help"], capture_output=True, cwd=root)
+    return perf_counter() - started
+
+
+def _child(mode: str, corpus_path: str, options: dict, results):
+    try:
+        results.put(run_mode(mode, corpus_path, options))
+    except Exception as e:
+        results.put({"mode": mode, "error": repr(e)})
+
+
+# wait for the result of a mode, a child killed before reporting (oom, signal,
+# native crash) is recorded as an error instead of blocking the suite
+def _result(mode: str, process, results) -> dict:
+    while True:
+        try:
+            return results.get(timeout=1.0)
+        except Empty:
+            if not process.is_alive():
+                break
+    # the result may have been flushed right before the child exited
+    try:
+        return results.get(timeout=1.0)
+    except Empty:
+        return {"mode": mode, "error": f"exit code {process.exitcode}"}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="ChromaDB Ingestor Benchmarks",
+                                     description="Reproducible ingestion benchmarks with synthetic corpora")
+    parser.add_argument("--documents", type=int, default=200)
+    parser.add_argument("--mean-words", type=int, default=500)
+    parser.add_argument("--distribution", choices=("fixed", "uniform", "lognormal"), default="lognormal")
+    parser.add_argument("--pdf-ratio", type=float, default=0.0)
+    parser.add_argument("--duplicate-ratio", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--modes", default=",".join(MODES))
+    parser.add_argument("--splitter", choices=("semantic", "semantic_reuse", "token", "character"), default="semantic")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="token and character splitters")
+    parser.add_argument("--chunk-overlap", type=int, default=0, help="token and character splitters")
+    parser.add_argument("--separator", default="\n\n", help="token and character splitters")
+    parser.add_argument("--embedding-mode", choices=("none", "pooled", "threshold"), default="none",
+                        help="chunk embedding reuse of the semantic_reuse splitter")
+    parser.add_argument("--reembed-threshold", type=int, default=1000, help="semantic_reuse threshold mode")
+    parser.add_argument("--batches", type=int, default=1)
+    parser.add_argument("--window-size", type=int, default=32)
+    parser.add_argument("--workers", default="load=1,prepare=1,split=2,embed=2,write=1")
+    parser.add_argument("--dedup-threshold", type=float, default=0.0, help="enable chunk deduplication at this similarity")
+    parser.add_argument("--embedding", choices=EMBEDDINGS, default="fake", help="hashed random vectors or lexical bag of words")
+    parser.add_argument("--dimensions", type=int, default=384)
+    parser.add_argument("--latency", type=float, default=0.0, help="simulated seconds per embedding call")
+    parser.add_argument("--corpus", default=None, help="reuse an existing corpus directory")
+    parser.add_argument("-o", "--output", default=None, help="write the JSON report to this file")
+    arguments = parser.parse_args()
+
+    options = {"splitter": arguments.splitter,
+               "chunk_size": arguments.chunk_size,
+               "chunk_overlap": arguments.chunk_overlap,
+               "separator": arguments.separator,
+               "embedding_mode": arguments.embedding_mode,
+               "reembed_threshold": arguments.reembed_threshold,
+               "batches": arguments.batches,
+               "window_size": arguments.window_size,
+               "workers": {k: int(v) for k, v in (w.split("=") for w in arguments.workers.split(","))},
+               "dedup_threshold": arguments.dedup_threshold,
+               "embedding": arguments.embedding,
+               "dimensions": arguments.dimensions,
+               "latency": arguments.latency}
+    corpus = {"documents": arguments.documents,
+              "mean_words": arguments.mean_words,
+              "distribution": arguments.distribution,
+              "pdf_ratio": arguments.pdf_ratio,
+              "duplicate_ratio": arguments.duplicate_ratio,
+              "seed": arguments.seed}
+
+    corpus_path = arguments.corpus
+    if corpus_path is None:
+        from benchmarks.corpus import generate_corpus
+        corpus_path = tempfile.mkdtemp(prefix="bench-corpus-")
+        started = perf_counter()
+        generate_corpus(corpus_path, **corpus)
+        corpus["generation_seconds"] = perf_counter() - started
+    corpus["path"] = corpus_path
+    corpus["bytes"] = sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(corpus_path) for f in files)
+
+    # every mode runs in a fresh interpreter
+    context = multiprocessing.get_context("spawn")
+    results = []
+    for mode in arguments.modes.split(","):
+        if mode not in MODES:
+            raise SystemExit(f"unsupported mode {mode}, expected one of {', '.join(MODES)}")
+        queue = context.Queue()
+        process = context.Process(target=_child, args=(mode, corpus_path, options, queue))
+        process.start()
+        result = _result(mode, process, queue)
+        process.join()
+        if "seconds" in result:
+            result["documents_per_second"] = arguments.documents / result["seconds"] if result["seconds"] > 0 else 0.0
+        results.append(result)
+
+    report = {"revision": git_revision(),
+              "python": platform.python_version(),
+              "platform": platform.platform(),
+              "cpus": os.cpu_count(),
+              "cli_startup_seconds": cli_startup_seconds(),
+              "corpus": corpus,
+              "options": options,
+              "results": results}
+    output = json.dumps(report, indent=2)
+    if arguments.output is not None:
+        with open(arguments.output, "w") as f:
+            f.write(output)
+    print(output)
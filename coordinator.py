@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+
+# ChromaDB Ingestor - sharded ingestion coordinator
+#
+# reports per-shard and per-worker progress of the work queue shared by the
+# ingestion workers of a collection, and hands the claims of stragglers back
+# to the queue so that the other workers pick them up. files that used up
+# sharding.max_attempts are reported as failed until they are retried
+#
+# usage: python coordinator.py -c parameters.yaml [--rebalance] [--release WORKER] [--retry-failed] [--watch SECONDS]
+
+import argparse
+from sys import exit
+from time import time, sleep
+from yaml import safe_load, YAMLError
+from prettytable import PrettyTable
+from libs.utils.console_utils import ANSIColors
+from libs.utils.parameters import Parameters
+from libs.loaders.workqueue import WorkQueue
+
+
+def report(queue: WorkQueue) -> None:
+    shard_table = PrettyTable()
+    shard_table.field_names = ["Shard", "Pending", "Claimed", "Done", "Failed", "Progress"]
+    totals = {"pending": 0, "claimed": 0, "done": 0, "failed": 0}
+    for shard, counts in sorted(queue.progress().items()):
+        total = sum(counts.values())
+        shard_table.add_row([shard, counts["pending"], counts["claimed"], counts["done"], counts["failed"],
+                             f"{100.0 * counts['done'] / total:.1f}%"])
+        for state in totals:
+            totals[state] += counts[state]
+    print(shard_table)
+
+    now = time()
+    worker_table = PrettyTable()
+    worker_table.field_names = ["Worker", "Home Shard", "Claimed", "Completed", "Files/s", "Last Heartbeat", "Status"]
+    for w in queue.workers():
+        elapsed = max(w["heartbeat"] - w["started"], 1e-6)
+        silent = now - w["heartbeat"]
+        status = "stale" if (silent > queue.lease and w["claimed"] > 0) else ("idle" if w["claimed"] == 0 else "active")
+        worker_table.add_row([w["worker"], w["shard"], w["claimed"], w["completed"], f"{w['completed'] / elapsed:.2f}", f"{silent:.0f}s ago", status])
+    print(worker_table)
+    print(f"Total: {totals['done']} done, {totals['claimed']} claimed, {totals['pending']} pending, {totals['failed']} failed")
+    for path in queue.failed():
+        print(f"Failed: {path}")
+
+
+if __name__ == "__main__":
+    ttyWriter = ANSIColors()
+    parser = argparse.ArgumentParser(prog="ChromaDB Ingestor Coordinator",
+                                     description="Progress and rebalancing of sharded ingestion workers")
+
+    parser.add_argument("-c", "--config_file", action="store", required=True)
+    parser.add_argument("--rebalance", action="store_true", default=False,
+                        help="release the claims of workers silent for more than sharding.lease seconds")
+    parser.add_argument("--lease", action="store", type=float, default=None,
+                        help="override sharding.lease when rebalancing")
+    parser.add_argument("--release", action="append", default=[],
+                        help="release every claim of this worker (repeatable)")
+    parser.add_argument("--retry-failed", action="store_true", default=False,
+                        help="queue the failed files again with a fresh set of attempts")
+    parser.add_argument("--reset", action="store_true", default=False,
+                        help="drop the queue, the next workers re-queue every file")
+    parser.add_argument("--watch", action="store", type=float, default=0,
+                        help="refresh the report every N seconds, rebalancing each time with --rebalance")
+    arguments = parser.parse_args()
+
+    try:
+        with open(arguments.config_file, "r") as f:
+            parms = Parameters(safe_load(f))
+    except YAMLError as e:
+        ttyWriter.print_error(text=e)
+        exit(1)
+    except Exception as e:
+        ttyWriter.print_error(text=e)
+        exit(1)
+
+    sharding_parms = parms.get("sharding")
+    if sharding_parms is None or sharding_parms.mode != "queue":
+        ttyWriter.print_error("The coordinator requires sharding.mode queue. Aborting.")
+        exit(1)
+
+    # same scope as the workers of main.py
+    if parms.chromadb.remote:
+        scope = f"{parms.chromadb.host}:{parms.chromadb.port}/{parms.chromadb.collection}"
+    else:
+        scope = parms.chromadb.collection
+    queue = WorkQueue(path=sharding_parms.queue, scope=scope,
+                      shards=int(sharding_parms.get("shards", 1)), lease=float(sharding_parms.get("lease", 600)),
+                      max_attempts=int(sharding_parms.get("max_attempts", 3)))
+    ttyWriter.print_success(f"{queue}")
+
+    if arguments.reset:
+        queue.reset()
+        ttyWriter.print_warning("Queue reset")
+    if arguments.retry_failed:
+        ttyWriter.print_warning(f"Queued {queue.retry_failed()} failed files again")
+    if len(arguments.release) > 0:
+        ttyWriter.print_warning(f"Released {queue.rebalance(workers=arguments.release)} files claimed by {', '.join(arguments.release)}")
+
+    while True:
+        if arguments.rebalance:
+            released = queue.rebalance(lease=arguments.lease)
+            if released > 0:
+                ttyWriter.print_warning(f"Rebalanced {released} files claimed by stale workers")
+        report(queue)
+        if arguments.watch <= 0:
+            break
+        sleep(arguments.watch)
@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+
+# ChromaDB Ingestor - HNSW parameter evaluation
+#
+# reads the vectors stored in the configured collection, rebuilds them into a
+# scratch collection with the candidate hnsw parameters and reports ingest rate,
+# recall@k against exact NumPy brute-force neighbours and query latency percentiles
+# for one or more search_ef values. the configured collection is never modified
+#
+# usage: python evaluate.py -c parameters.yaml [--M 32] [--construction-ef 200] [--search-ef 50,100,200] [--live]
+
+import json
+import shutil
+import argparse
+import tempfile
+from sys import exit
+import numpy as np
+from yaml import safe_load, YAMLError
+from prettytable import PrettyTable
+from libs.utils.console_utils import ANSIColors
+from libs.utils.parameters import Parameters
+from libs.chroma.hnsw import hnsw_metadata, collection_parameters, read_vectors, evaluate_queries, build_collection
+
+
+def row(label: str, parameters: dict, result: dict, k: int) -> list:
+    return [label, parameters.get("construction_ef", "-"), parameters.get("M", "-"), parameters.get("search_ef", "-"),
+            f"{result[f'recall@{k}']:.4f}", f"{result['latency_ms_p50']:.2f}", f"{result['latency_ms_p90']:.2f}",
+            f"{result['latency_ms_p99']:.2f}", f"{result['ingest_vectors_per_second']:.0f}" if "ingest_vectors_per_second" in result else "-"]
+
+
+if __name__ == "__main__":
+    ttyWriter = ANSIColors()
+    parser = argparse.ArgumentParser(prog="ChromaDB Ingestor HNSW Evaluation",
+                                     description="Recall, query latency and ingest rate of HNSW parameter sets")
+
+    parser.add_argument("-c", "--config_file", action="store", required=True)
+    parser.add_argument("-k", action="store", type=int, default=10, help="neighbours per query")
+    parser.add_argument("--samples", action="store", type=int, default=200,
+                        help="stored vectors used as queries")
+    parser.add_argument("--limit", action="store", type=int, default=100000,
+                        help="stored vectors read from the collection, 0 reads them all")
+    parser.add_argument("--seed", action="store", type=int, default=42)
+    parser.add_argument("--construction-ef", action="store", type=int, default=None, help="override chromadb.hnsw.construction_ef")
+    parser.add_argument("--M", action="store", type=int, default=None, help="override chromadb.hnsw.M")
+    parser.add_argument("--batch-size", action="store", type=int, default=None, help="override chromadb.hnsw.batch_size")
+    parser.add_argument("--sync-threshold", action="store", type=int, default=None, help="override chromadb.hnsw.sync_threshold")
+    parser.add_argument("--search-ef", action="store", default=None,
+                        help="comma separated search_ef values to sweep (default chromadb.hnsw.search_ef)")
+    parser.add_argument("--live", action="store_true", default=False,
+                        help="also query the configured collection with its current settings")
+    parser.add_argument("-o", "--output", action="store", default=None, help="write the JSON report to this file")
+    arguments = parser.parse_args()
+
+    try:
+        with open(arguments.config_file, "r") as f:
+            parms = Parameters(safe_load(f))
+    except YAMLError as e:
+        ttyWriter.print_error(text=e)
+        exit(1)
+    except Exception as e:
+        ttyWriter.print_error(text=e)
+        exit(1)
+
+    if parms.chromadb.remote:
+        from libs.vectorstore.remote import chroma_client
+        client = chroma_client(host=parms.chromadb.host, port=int(parms.chromadb.port))
+    else:
+        from chromadb import PersistentClient
+        client = PersistentClient(path=parms.chromadb.persist_dir)
+    try:
+        collection = client.get_collection(parms.chromadb.collection)
+    except Exception as e:
+        ttyWriter.print_error(f"Cannot open collection {parms.chromadb.collection}: {e}")
+        exit(1)
+    space = (collection.metadata or {}).get("hnsw:space", "l2")
+
+    # candidate parameter set: chromadb.hnsw with the command line overrides
+    parameters = dict(parms.chromadb.hnsw.data) if parms.chromadb.get("hnsw") is not None else {}
+    for key, value in (("construction_ef", arguments.construction_ef), ("M", arguments.M),
+                       ("batch_size", arguments.batch_size), ("sync_threshold", arguments.sync_threshold)):
+        if value is not None:
+            parameters[key] = value
+    if arguments.search_ef is not None:
+        search_efs = [int(ef) for ef in arguments.search_ef.split(",")]
+    else:
+        search_efs = [parameters.get("search_ef")]
+
+    ttyWriter.print_success(f"Reading vectors of {parms.chromadb.collection} ({collection.count()} records, space {space})...")
+    ids, vectors = read_vectors(collection, limit=arguments.limit, batch_size=max(min(client.get_max_batch_size(), 5000), 1))
+    if len(ids) == 0:
+        ttyWriter.print_error("The collection is empty. Aborting.")
+        exit(1)
+    index = {record_id: n for n, record_id in enumerate(ids)}
+    rng = np.random.default_rng(arguments.seed)
+    queries = vectors[rng.choice(len(ids), size=min(arguments.samples, len(ids)), replace=False)]
+    ttyWriter.print_success(f"Evaluating {len(queries)} queries over {len(ids)} vectors of {vectors.shape[1]} dimensions, k={arguments.k}")
+
+    table = PrettyTable()
+    table.field_names = ["Index", "construction_ef", "M", "search_ef", f"Recall@{arguments.k}", "p50 ms", "p90 ms", "p99 ms", "Ingest vec/s"]
+    results = []
+
+    if arguments.live:
+        if len(ids) < collection.count():
+            ttyWriter.print_warning(f"Skipping the live collection: only {len(ids)} of {collection.count()} vectors were read (--limit 0 reads them all)")
+        else:
+            current = collection_parameters(collection)
+            result = evaluate_queries(collection, queries, vectors, index, arguments.k, space)
+            results.append({"index": "live", "parameters": current, **result})
+            table.add_row(row("live", current, result, min(arguments.k, len(ids))))
+
+    # scratch collection next to the configured one: a temporary local directory, or
+    # a temporary collection on the remote server
+    scratch_dir = None
+    if parms.chromadb.remote:
+        scratch_client = client
+    else:
+        from chromadb import PersistentClient
+        scratch_dir = tempfile.mkdtemp(prefix="hnsw-eval-")
+        scratch_client = PersistentClient(path=scratch_dir)
+    scratch_name = f"{parms.chromadb.collection}-hnsw-eval"
+    try:
+        try:
+            scratch_client.delete_collection(scratch_name)
+        except Exception:
+            pass
+        scratch = scratch_client.create_collection(scratch_name, metadata=hnsw_metadata(space, parameters))
+        ttyWriter.print_success(f"Building scratch collection {scratch_name} with {hnsw_metadata(space, parameters)}...")
+        build = build_collection(scratch, ids, vectors, batch_size=max(scratch_client.get_max_batch_size(), 1))
+
+        for search_ef in search_efs:
+            if search_ef is not None:
+                scratch.modify(configuration={"hnsw": {"ef_search": int(search_ef)}})
+                if scratch_dir is not None:
+                    # the local client keeps the loaded index and its ef until the system is reopened
+                    scratch_client.clear_system_cache()
+                    scratch_client = PersistentClient(path=scratch_dir)
+                scratch = scratch_client.get_collection(scratch_name)
+            candidate = {**parameters, **({"search_ef": search_ef} if search_ef is not None else {})}
+            result = {**build, **evaluate_queries(scratch, queries, vectors, index, arguments.k, space)}
+            results.append({"index": "scratch", "parameters": candidate, **result})
+            table.add_row(row("scratch", candidate, result, min(arguments.k, len(ids))))
+    finally:
+        try:
+            scratch_client.delete_collection(scratch_name)
+        except Exception:
+            pass
+        if scratch_dir is not None:
+            shutil.rmtree(scratch_dir, ignore_errors=True)
+
+    print(table)
+    if arguments.output is not None:
+        with open(arguments.output, "w") as f:
+            json.dump({"collection": parms.chromadb.collection, "space": space, "vectors": len(ids),
+                       "dimensions": int(vectors.shape[1]), "results": results}, f, indent=2)
+        ttyWriter.print_success(f"Report written to {arguments.output}")
@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+
+import re
+import threading
+from zlib import crc32
+from hashlib import sha256
+from numpy import array, multiply, random, uint64, ndarray
+from libs.utils.metrics import metrics
+
+# minhash permutations are computed modulo a mersenne prime below 2^31,
+# so that a * x + b never overflows 64 bit integers
+_PRIME = (1 << 31) - 1
+
+
+def normalize_text(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+# pick the (bands, rows) split of the signature whose lsh threshold
+# (1 / bands) ^ (1 / rows) is closest to the requested similarity
+def lsh_bands(num_perm: int, threshold: float) -> tuple:
+    splits = [(b, num_perm // b) for b in range(1, num_perm + 1) if num_perm % b == 0]
+    return min(splits, key=lambda s: abs((1.0 / s[0]) ** (1.0 / s[1]) - threshold))
+
+
+class MinHasher(object):
+    def __init__(self, num_perm: int = 64, shingle_size: int = 3, seed: int = 1):
+        self.num_perm: int = num_perm
+        self.shingle_size: int = max(shingle_size, 1)
+        rng = random.default_rng(seed)
+        self._a: ndarray = rng.integers(1, _PRIME, num_perm, dtype=uint64)
+        self._b: ndarray = rng.integers(0, _PRIME, num_perm, dtype=uint64)
+
+    # word shingles of the normalized text, short texts are a single shingle
+    def shingles(self, text: str) -> set:
+        words = text.split(" ")
+        if len(words) <= self.shingle_size:
+            return {text}
+        return {" ".join(words[k:k+self.shingle_size]) for k in range(len(words) - self.shingle_size + 1)}
+
+    def signature(self, text: str) -> ndarray:
+        hashes = array([crc32(s.encode("utf-8")) for s in self.shingles(text)], dtype=uint64) % _PRIME
+        return ((multiply.outer(hashes, self._a) + self._b) % _PRIME).min(axis=0)
+
+
+# drops exact and near-duplicate chunks before they are embedded and written.
+# exact duplicates are found by hashing the normalized text, near-duplicates by
+# minhash lsh candidates whose estimated jaccard similarity reaches threshold.
+# the first occurrence is kept, the sources of its duplicates are collected as
+# references and stored in its metadata once the run is complete. the dropped
+# chunks of every file are kept as well, so that the manifest can ingest the
+# file again when the canonical node goes away
+class NodeDeduplicator(object):
+    def __init__(self, threshold: float = 0.9, num_perm: int = 64, shingle_size: int = 3, max_references: int = 32):
+        if not 0.0 < threshold <= 1.0:
+            raise ValueError(f"NodeDeduplicator: threshold must be in (0, 1], got {threshold}")
+        self.threshold: float = threshold
+        self.max_references: int = max_references
+        self.nodes: int = 0
+        self.exact: int = 0
+        self.near: int = 0
+
+        self._near: bool = threshold < 1.0
+        self._hasher: MinHasher = MinHasher(num_perm=num_perm, shingle_size=shingle_size)
+        self._bands, self._rows = lsh_bands(num_perm, threshold)
+        self._digests: dict = {}
+        self._signatures: dict = {}
+        self._buckets: list = [{} for _ in range(self._bands)]
+        self._references: dict = {}
+        self._dropped: dict = {}
+        self._lock = threading.Lock()
+
+    def _reference(self, node) -> str:
+        source = node.metadata.get("file_path", node.ref_doc_id)
+        if node.start_char_idx is None:
+            return source
+        return f"{source}:{node.start_char_idx}-{node.end_char_idx}"
+
+    def _candidate(self, signature: ndarray) -> str:
+        seen: set = set()
+        for band in range(self._bands):
+            key = signature[band*self._rows:(band+1)*self._rows].tobytes()
+            for canonical in self._buckets[band].get(key, ()):
+                if canonical in seen:
+                    continue
+                seen.add(canonical)
+                if (self._signatures[canonical] == signature).mean() >= self.threshold:
+                    return canonical
+        return None
+
+    def _index(self, node_id: str, signature: ndarray):
+        self._signatures[node_id] = signature
+        for band in range(self._bands):
+            key = signature[band*self._rows:(band+1)*self._rows].tobytes()
+            self._buckets[band].setdefault(key, []).append(node_id)
+
+    # returns the nodes that are not duplicates of a node seen before
+    def filter(self, nodes: list) -> list:
+        unique: list = []
+        with self._lock:
+            exact, near = self.exact, self.near
+            for node in nodes:
+                text = normalize_text(node.get_content())
+                digest = sha256(text.encode("utf-8", errors="surrogatepass")).digest()
+                canonical = self._digests.get(digest)
+                if canonical is not None:
+                    self.exact += 1
+                elif self._near:
+                    signature = self._hasher.signature(text)
+                    canonical = self._candidate(signature)
+                    if canonical is not None:
+                        self.near += 1
+                    else:
+                        self._index(node.node_id, signature)
+
+                if canonical is not None:
+                    reference = self._reference(node)
+                    references = self._references.setdefault(canonical, [0, []])
+                    references[0] += 1
+                    if len(references[1]) < self.max_references:
+                        references[1].append(reference)
+                    self._dropped.setdefault(node.metadata.get("file_path"), []).append((canonical, reference))
+                else:
+                    self._digests[digest] = node.node_id
+                    unique.append(node)
+            self.nodes += len(nodes)
+            exact, near = self.exact - exact, self.near - near
+
+        metrics.count("dedup_exact", exact)
+        metrics.count("dedup_near", near)
+        return unique
+
+    # canonical node id -> (duplicate count, sources of the first max_references duplicates)
+    def references(self) -> dict:
+        with self._lock:
+            return {k: (count, list(sources)) for k, (count, sources) in self._references.items()}
+
+    # (canonical node id, reference) of the chunks of a file dropped so far
+    def duplicates(self, path: str) -> list:
+        with self._lock:
+            return list(self._dropped.get(path, []))
+
+    def report(self) -> dict:
+        duplicates = self.exact + self.near
+        return {"nodes": self.nodes,
+                "exact_duplicates": self.exact,
+                "near_duplicates": self.near,
+                "dedup_ratio": (duplicates / self.nodes) if self.nodes > 0 else 0.0}
+
+    def __str__(self) -> str:
+        return f"NodeDeduplicator: threshold {self.threshold} - {self._bands} bands x {self._rows} rows"
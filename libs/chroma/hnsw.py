@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+
+from time import perf_counter
+import numpy as np
+from chromadb import Collection
+
+# chromadb.hnsw configuration keys, as collection metadata keys (hnsw:<key>) and
+# as names of the collection configuration used to update an existing collection
+HNSW_PARAMETERS = {"construction_ef": "ef_construction",
+                   "M": "max_neighbors",
+                   "search_ef": "ef_search",
+                   "batch_size": "batch_size",
+                   "sync_threshold": "sync_threshold"}
+
+# only these can be changed once the collection exists, the graph is built with the others
+HNSW_MUTABLE = ("search_ef", "batch_size", "sync_threshold")
+
+
+def hnsw_metadata(space: str, hnsw: dict = None) -> dict:
+    metadata = {"hnsw:space": space}
+    for key, value in (hnsw or {}).items():
+        if key not in HNSW_PARAMETERS:
+            raise ValueError(f"hnsw: unsupported parameter {key}, expected one of {', '.join(HNSW_PARAMETERS)}")
+        if value is not None:
+            metadata[f"hnsw:{key}"] = int(value)
+    return metadata
+
+
+# effective hnsw parameters of a collection. updated values are only reflected by the
+# collection configuration (chromadb >= 1.0), not by the creation metadata
+def collection_parameters(collection: Collection) -> dict:
+    parameters = {key[len("hnsw:"):]: value for key, value in (collection.metadata or {}).items() if key.startswith("hnsw:")}
+    configuration = (getattr(collection, "configuration_json", None) or {}).get("hnsw") or {}
+    for key, option in HNSW_PARAMETERS.items():
+        if configuration.get(option) is not None:
+            parameters[key] = configuration[option]
+    return parameters
+
+
+# get or create a collection with the configured hnsw parameters. the search time
+# parameters of an existing collection are updated in place, a different build
+# parameter only warns since the index would have to be rebuilt
+def open_collection(client, name: str, space: str, hnsw: dict = None) -> Collection:
+    metadata = hnsw_metadata(space, hnsw)
+    collection = client.get_or_create_collection(name, metadata=metadata)
+
+    current = collection_parameters(collection)
+    update = {}
+    for key, option in HNSW_PARAMETERS.items():
+        wanted = metadata.get(f"hnsw:{key}")
+        actual = current.get(key, wanted)
+        if wanted is None or actual == wanted:
+            continue
+        if key in HNSW_MUTABLE:
+            update[option] = wanted
+        else:
+            print(f"hnsw: collection {name} was built with {key}={actual}, {wanted} needs a rebuild of the collection")
+    if len(update) > 0:
+        try:
+            collection.modify(configuration={"hnsw": update})
+        except Exception as e:
+            print(f"hnsw: cannot update {', '.join(update)} of collection {name}: {e}")
+    return collection
+
+
+# ids and vectors of up to limit stored records (0 reads them all), paged by batch_size
+def read_vectors(collection: Collection, limit: int = 0, batch_size: int = 1000) -> tuple:
+    total = collection.count() if limit <= 0 else min(limit, collection.count())
+    ids, vectors = [], []
+    for offset in range(0, total, batch_size):
+        page = collection.get(include=["embeddings"], limit=min(batch_size, total - offset), offset=offset)
+        ids.extend(page["ids"])
+        vectors.append(np.asarray(page["embeddings"], dtype=np.float32))
+    return ids, (np.concatenate(vectors) if len(vectors) > 0 else np.zeros((0, 0), dtype=np.float32))
+
+
+# chroma distances between every query and every base vector
+def distances(queries: np.ndarray, base: np.ndarray, space: str) -> np.ndarray:
+    if space == "cosine":
+        q = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        b = base / np.maximum(np.linalg.norm(base, axis=1, keepdims=True), 1e-12)
+        return 1.0 - q @ b.T
+    elif space == "ip":
+        return 1.0 - queries @ base.T
+    elif space == "l2":
+        return np.maximum((queries ** 2).sum(axis=1)[:, None] - 2.0 * (queries @ base.T) + (base ** 2).sum(axis=1)[None, :], 0.0)
+    raise ValueError(f"hnsw: unsupported space {space}")
+
+
+# exact k nearest neighbours by brute force, queries are processed in blocks to bound memory.
+# returns the neighbour rows and the distance of the k-th neighbour of every query
+def exact_neighbors(queries: np.ndarray, base: np.ndarray, k: int, space: str, block: int = 256) -> tuple:
+    k = min(k, len(base))
+    rows, kth = [], []
+    for start in range(0, len(queries), block):
+        d = distances(queries[start:start+block], base, space)
+        top = np.argpartition(d, k - 1, axis=1)[:, :k]
+        order = np.take_along_axis(d, top, axis=1).argsort(axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        rows.append(top)
+        kth.append(np.take_along_axis(d, top[:, -1:], axis=1)[:, 0])
+    return np.concatenate(rows), np.concatenate(kth)
+
+
+# query the collection with every sample vector and compare with the exact neighbours.
+# a returned id is a hit when its exact distance is within the k-th exact distance,
+# so that equidistant (duplicate) vectors do not count as misses
+def evaluate_queries(collection: Collection, queries: np.ndarray, base: np.ndarray, index: dict,
+                     k: int, space: str, tolerance: float = 1e-5) -> dict:
+    _, kth = exact_neighbors(queries, base, k, space)
+    k = min(k, len(base))
+    latencies, hits = [], 0
+    for query, bound in zip(queries, kth):
+        started = perf_counter()
+        result = collection.query(query_embeddings=[query.tolist()], n_results=k, include=["distances"])
+        latencies.append(perf_counter() - started)
+        rows = [index[i] for i in result["ids"][0] if i in index]
+        if len(rows) > 0:
+            hits += int((distances(query[None, :], base[rows], space)[0] <= bound + tolerance).sum())
+    latencies = np.asarray(latencies) * 1000.0
+    return {"queries": len(queries),
+            "k": k,
+            f"recall@{k}": hits / max(len(queries) * k, 1),
+            "latency_ms_mean": float(latencies.mean()) if len(latencies) > 0 else 0.0,
+            "latency_ms_p50": float(np.percentile(latencies, 50)) if len(latencies) > 0 else 0.0,
+            "latency_ms_p90": float(np.percentile(latencies, 90)) if len(latencies) > 0 else 0.0,
+            "latency_ms_p99": float(np.percentile(latencies, 99)) if len(latencies) > 0 else 0.0}
+
+
+# insert ids and vectors into a fresh collection, returns the ingest rate in vectors/s
+def build_collection(collection: Collection, ids: list, vectors: np.ndarray, batch_size: int = 5000) -> dict:
+    started = perf_counter()
+    for start in range(0, len(ids), batch_size):
+        collection.add(ids=ids[start:start+batch_size], embeddings=vectors[start:start+batch_size])
+    elapsed = perf_counter() - started
+    return {"vectors": len(ids),
+            "ingest_seconds": elapsed,
+            "ingest_vectors_per_second": len(ids) / elapsed if elapsed > 0 else 0.0}
@@ -0,0 +1,336 @@
+#!/usr/bin/env python
+
+from typing import Callable
+from chromadb import Collection
+from libs.loaders.dirloader import dirLoader, fileLoader, sourceLoader, loadDocuments, iterateWindows
+from libs.loaders.manifest import IngestManifest
+from libs.loaders.sources import discoverSources
+from libs.loaders.journal import IngestJournal
+from libs.loaders.workqueue import ShardFilter, WorkQueue
+from libs.splitters.semantic_splitter import semanticSplitterPipeline
+from libs.splitters.reuse_splitter import reuseSplitterPipeline
+from libs.splitters.fixed_splitter import fixedSplitterPipeline, SPLITTER_MODES
+from libs.utils.tools import splitList
+from libs.utils.pipeline import Pipeline, Stage
+from libs.utils.metrics import metrics
+from libs.loaders.dataloader import prepare_corpus
+from libs.chroma.writer import ChromaWriter, assign_chunk_ids
+from libs.chroma.dedup import NodeDeduplicator
+from llama_index.core import StorageContext
+
+
+# ingestion logic shared by the local and the remote chromadb wrappers
+# subclasses are expected to set _collection, _storage_context and _embed_function
+class ChromaIngestor(object):
+    _collection: Collection = None
+    _storage_context: StorageContext = None
+    _embed_function: Callable = None
+    _writer: ChromaWriter = None
+    _splitter: str = "semantic"
+    _splitter_options: dict = {}
+    _manifest: IngestManifest = None
+    _journal: IngestJournal = None
+    _corpus_stats: dict = {}
+    _dedup: NodeDeduplicator = None
+    _queue: WorkQueue = None
+    _worker: str = None
+    max_payload_bytes: int = 16 * 1024 * 1024
+
+    def Client(self):
+        raise NotImplementedError("ChromaIngestor: subclasses must return their chromadb client")
+
+    def Collection(self) -> Collection:
+        return self._collection
+
+    def Writer(self) -> ChromaWriter:
+        if self._writer is None:
+            self._writer = ChromaWriter(self._collection,
+                                        max_batch_size=self.Client().get_max_batch_size(),
+                                        max_payload_bytes=self.max_payload_bytes)
+        return self._writer
+
+    def DeleteNodes(self, node_ids: list) -> int:
+        step: int = max(self.Client().get_max_batch_size(), 1)
+        with metrics.timer("delete"):
+            for k in range(0, len(node_ids), step):
+                self._collection.delete(ids=node_ids[k:k+step])
+        metrics.count("deleted_nodes", len(node_ids))
+        return len(node_ids)
+
+    def GenerateEmbeddings(self, training_data_path: str = ".",
+                           pattern: dict = [".txt"],
+                           show_progress: bool = True, batches: int = 1,
+                           manifest: IngestManifest = None,
+                           window_size: int = 0,
+                           pipeline_workers: dict = None,
+                           queue_size: int = 4,
+                           splitter: str = "semantic",
+                           splitter_options: dict = None,
+                           journal: IngestJournal = None,
+                           corpus_stats: dict = None,
+                           dedup: NodeDeduplicator = None,
+                           shard: ShardFilter = None,
+                           work_queue: WorkQueue = None,
+                           worker: str = "worker",
+                           claim_size: int = 16,
+                           sources: list = None,
+                           loader_options: dict = None):
+        self._splitter = splitter
+        self._corpus_stats = corpus_stats or {}
+        self._splitter_options = splitter_options or {}
+        self._manifest, self._journal = manifest, journal
+        self._dedup = dedup
+        self._queue, self._worker = work_queue, worker
+        self._changed, self._committed, self._claimed = {}, set(), []
+        self._annotate: set = set()
+
+        # load custom knowledge data and tokenize it
+        if sources is not None:
+            # training_data.sources: the glob is walked once up front since the manifest,
+            # shard and work queue need the whole file list, files are then loaded by
+            # per-type parallel loaders
+            data_types: dict = dict(discoverSources(sources))
+            files: list = list(data_types.keys())
+            make_loader = lambda claimed: sourceLoader(claimed, data_types, **(loader_options or {}))
+        else:
+            data_loader = dirLoader(training_data_path, extensions=pattern)
+            files: list = [str(f) for f in data_loader.input_files]
+            make_loader = fileLoader
+        self._loaders = []
+
+        # static sharding: only keep the files that hash to this worker
+        if shard is not None and work_queue is None:
+            files = shard.select(files)
+            print(f"{shard}: {len(files)} files")
+
+        # incremental mode: only load new or modified files
+        removed, requeued = [], []
+        if manifest is not None:
+            self._changed, removed = manifest.diff(files)
+            if shard is not None and work_queue is None:
+                removed = shard.select(removed)
+            print(f"Manifest: {len(self._changed)} new or modified files, {len(removed)} removed, "
+                  f"{len(files) - len(self._changed)} unchanged")
+
+            # chunks dropped as duplicates of a node of a changed or removed file lose
+            # their canonical copy: their (unchanged) files are ingested again
+            candidates = set(files)
+            requeued = [p for p in manifest.dependents(manifest.node_ids(list(self._changed) + removed))
+                        if p in candidates and p not in self._changed]
+            if len(requeued) > 0:
+                manifest.invalidate(requeued)
+                self._changed.update(manifest.diff(requeued)[0])
+                print(f"Manifest: {len(requeued)} files with duplicates of changed nodes are ingested again")
+            # the canonical nodes referenced by these files are annotated again after the run
+            self._annotate = manifest.canonicals(list(self._changed) + removed)
+            files = list(self._changed.keys())
+
+        # resumed run: skip the files committed by a previous attempt
+        if journal is not None:
+            completed = journal.completed()
+            if len(completed) > 0:
+                print(f"Journal: skipping {len([f for f in files if f in completed])} files committed by a previous attempt")
+                files = [f for f in files if f not in completed]
+
+        # queue mode: workers sharing the queue claim disjoint batches of files
+        if work_queue is not None:
+            print(f"{work_queue}: {work_queue.populate(files)} files queued by {worker}")
+            if manifest is not None and len(requeued) > 0:
+                work_queue.requeue(requeued)
+            work_queue.register(worker, shard.index if shard is not None else None)
+            work_queue.start_heartbeat(worker)
+            claims = work_queue.claims(worker, limit=claim_size, shard=shard.index if shard is not None else None)
+        else:
+            claims = [files] if len(files) > 0 else []
+        loaders = (self._track(make_loader(claimed)) for claimed in self._claims(claims))
+
+        if pipeline_workers is not None:
+            # pipelined mode: stages overlap, each one with its own worker threads. files
+            # are handed to the load stage window_size files at a time
+            size = window_size if window_size > 0 else 64
+            groups = (claimed[k:k+size] for claimed in self._claims(claims) for k in range(0, len(claimed), size))
+            for window_files, nodes_list in self._ingest_pipelined(groups, make_loader, pipeline_workers, queue_size=queue_size):
+                self._commit_files(window_files, nodes_list)
+        elif window_size > 0:
+            # streaming mode: documents -> nodes -> embeddings -> chroma, one window at a time
+            windows = (window for loader in loaders for window in iterateWindows(loader, window_size))
+            for window, raw_documents in enumerate(windows):
+                print(f"Ingesting window {window} ({len(raw_documents)} documents)...")
+                self._ingest(raw_documents, show_progress=show_progress, batches=batches)
+        else:
+            for data_loader in loaders:
+                self._ingest(loadDocuments(data_loader), show_progress=show_progress, batches=batches)
+        if work_queue is not None:
+            work_queue.stop_heartbeat()
+
+        # files that yielded no documents at all. files the loader had to skip
+        # (unreadable, timed out) stay uncommitted so that the next run retries them
+        skipped = set(f for loader in self._loaders for f in getattr(loader, "skipped", []))
+        metrics.count("skipped_files", len(skipped))
+        if len(skipped) > 0:
+            print(f"Skipped {len(skipped)} files, they will be retried by the next run")
+        self._commit_files([f for f in self._claimed if f not in self._committed and f not in skipped], [])
+
+        if manifest is not None and len(removed) > 0:
+            print(f"Deleting {self.DeleteNodes(manifest.node_ids(removed))} nodes of removed files...")
+            manifest.forget(removed)
+
+        # duplicates are not written, their sources are referenced by the kept node.
+        # with a manifest the references of every run are counted, and nodes whose
+        # duplicates changed or went away are annotated again
+        references: dict = dedup.references() if dedup is not None else {}
+        if manifest is not None and len(references) + len(self._annotate) > 0:
+            references = manifest.references(self._annotate | set(references.keys()),
+                                             max_references=dedup.max_references if dedup is not None else 32)
+        if len(references) > 0:
+            with metrics.timer("annotate"):
+                annotated = self.Writer().annotate(references)
+            print(f"Annotated {annotated} nodes with duplicate references")
+        if dedup is not None:
+            print(f"Deduplication: {dedup.report()}")
+        if journal is not None:
+            journal.finish()
+
+    # batches of files to ingest: the whole file list, or the batches claimed from the work queue
+    def _claims(self, claims):
+        for claimed in claims:
+            # files queued by another worker are not in this worker's manifest diff yet
+            unknown = [f for f in claimed if f not in self._changed]
+            if self._manifest is not None and self._queue is not None and len(unknown) > 0:
+                self._changed.update(self._manifest.diff(unknown)[0])
+            self._claimed.extend(claimed)
+            yield claimed
+
+    def _track(self, loader):
+        if loader is not None:
+            self._loaders.append(loader)
+        return loader
+
+    # pipeline stages, shared by the sequential and the pipelined paths
+    def _prepare(self, raw_documents: list) -> list:
+        with metrics.timer("prepare"):
+            knowledge_body = prepare_corpus(raw_documents, **self._corpus_stats)
+        metrics.count("documents", len(knowledge_body))
+        print(f"Loaded {len(knowledge_body)} Documents...")
+        return knowledge_body
+
+    def _splitter_pipeline(self, knowledge_body: list):
+        if self._splitter == "semantic":
+            return semanticSplitterPipeline(documents=knowledge_body,
+                                            embedder=self._embed_function)
+        elif self._splitter == "semantic_reuse":
+            # keeps the sentence embeddings, pooled chunks skip the embedding stage
+            return reuseSplitterPipeline(documents=knowledge_body,
+                                         embedder=self._embed_function,
+                                         **self._splitter_options)
+        elif self._splitter in SPLITTER_MODES:
+            # fixed size token or character chunks, no embedding calls
+            return fixedSplitterPipeline(documents=knowledge_body,
+                                         mode=self._splitter,
+                                         **self._splitter_options)
+        else:
+            raise ValueError(f"ChromaIngestor: unsupported splitter {self._splitter}")
+
+    def _split(self, knowledge_body: list) -> list:
+        splitterPipeline = self._splitter_pipeline(knowledge_body)
+        # run node splitter
+        print(f"Splitting documents with the {self._splitter} splitter...")
+        with metrics.timer("split"):
+            nodes_list = assign_chunk_ids(splitterPipeline.run(documents=knowledge_body))
+        metrics.count("nodes", len(nodes_list))
+        print(f"Produced {len(nodes_list)} nodes")
+        return nodes_list
+
+    def _deduplicate(self, nodes_list: list) -> list:
+        if self._dedup is None:
+            return nodes_list
+        with metrics.timer("dedup"):
+            unique = self._dedup.filter(nodes_list)
+        if len(unique) < len(nodes_list):
+            print(f"Dropped {len(nodes_list) - len(unique)} duplicate nodes")
+        return unique
+
+    def _embed(self, nodes_list: list, show_progress: bool = False) -> list:
+        with metrics.timer("embed"):
+            return self.Writer().embed(nodes_list, self._embed_function, show_progress=show_progress)
+
+    def _write(self, nodes_list: list) -> list:
+        with metrics.timer("write"):
+            self.Writer().upsert(nodes_list)
+        return nodes_list
+
+    # prepare, split and index a list of documents, returns the generated nodes
+    # files are committed as soon as the last batch holding their nodes is written
+    def _ingest(self, raw_documents: list, show_progress: bool = True, batches: int = 1) -> list:
+        nodes_list = self._deduplicate(self._split(self._prepare(raw_documents)))
+
+        print(f"Preparing {batches} node batches...")
+        nodes: list = splitList(nodes_list, batches)
+
+        nodes_by_file: dict = {doc.metadata.get("file_path"): [] for doc in raw_documents}
+        for node in nodes_list:
+            nodes_by_file.setdefault(node.metadata.get("file_path"), []).append(node)
+        pending: dict = {path: len(file_nodes) for path, file_nodes in nodes_by_file.items()}
+
+        # embed each batch and upsert it straight into the collection
+        for batch_of_nodes in nodes:
+            self._write(self._embed(batch_of_nodes, show_progress=show_progress))
+            for node in batch_of_nodes:
+                pending[node.metadata.get("file_path")] -= 1
+            done = [path for path, count in pending.items() if count <= 0]
+            self._commit_files(done, [n for path in done for n in nodes_by_file[path]])
+            for path in done:
+                del pending[path]
+        self._commit_files(list(pending.keys()), [])
+        return nodes_list
+
+    # overlapped ingestion: loader, corpus preparation, splitter, embedder and
+    # writer run as concurrent stages connected by bounded queues, each with its
+    # own number of worker threads. every item travels as (files, payload) so
+    # that the manifest can be updated per window
+    def _ingest_pipelined(self, groups, make_loader: Callable, workers: dict, queue_size: int = 4):
+        def stage(name: str, func: Callable) -> Stage:
+            return Stage(name, lambda item: (item[0], func(item[1])),
+                         workers=int(workers.get(name, 1)), queue_size=queue_size)
+
+        def load(files: list) -> list:
+            return loadDocuments(self._track(make_loader(files)))
+
+        pipeline = Pipeline([stage("load", load),
+                             stage("prepare", self._prepare),
+                             stage("split", self._split),
+                             stage("dedup", self._deduplicate),
+                             stage("embed", self._embed),
+                             stage("write", self._write)])
+        source = ((set(files), files) for files in groups)
+        for files, nodes_list in pipeline.run(source):
+            yield files, nodes_list
+
+    # checkpoint committed files: record them in the manifest (dropping the nodes of
+    # their previous version) and in the run journal
+    def _commit_files(self, files: list, nodes_list: list):
+        files = [f for f in files if f is not None]
+        if len(files) == 0:
+            return
+
+        written: dict = {}
+        for node in nodes_list:
+            written.setdefault(node.metadata.get("file_path"), []).append(node.node_id)
+
+        if self._manifest is not None:
+            changed = [f for f in files if f in self._changed]
+            new_ids = set(node.node_id for node in nodes_list)
+            stale_ids = [i for i in self._manifest.node_ids(changed) if i not in new_ids]
+            if len(stale_ids) > 0:
+                print(f"Deleting {self.DeleteNodes(stale_ids)} stale nodes...")
+            for path in changed:
+                size, mtime, digest = self._changed.get(path)
+                self._manifest.record(path, size, mtime, digest, written.get(path, []),
+                                      self._dedup.duplicates(path) if self._dedup is not None else [])
+
+        metrics.count("committed_files", len(files))
+        if self._journal is not None:
+            self._journal.mark(files, {f: len(written.get(f, [])) for f in files})
+        if self._queue is not None:
+            self._queue.complete(self._worker, files)
+        self._committed.update(files)
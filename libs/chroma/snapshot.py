@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+
+import os
+import json
+from time import time
+from itertools import islice
+import numpy as np
+from numpy.lib.format import open_memmap
+from chromadb import Collection
+from libs.chroma.writer import ChromaWriter
+
+SNAPSHOT_VERSION: int = 1
+SNAPSHOT_DTYPES = ("float32", "float16")
+
+# a snapshot is a directory of columns, row n of every column is the same record:
+#   embeddings.npy   (count, dimensions) float32 or float16 matrix, memory-mapped on import
+#   ids.jsonl        one json string per line
+#   documents.jsonl  one json string (or null) per line
+#   metadatas.jsonl  one json object (or null) per line
+#   manifest.json    collection name and metadata, count, dimensions, dtype
+COLUMNS = ("ids", "documents", "metadatas")
+
+
+def read_manifest(path: str) -> dict:
+    with open(os.path.join(path, "manifest.json")) as f:
+        manifest = json.load(f)
+    if manifest.get("version") != SNAPSHOT_VERSION:
+        raise ValueError(f"snapshot: unsupported snapshot version {manifest.get('version')} in {path}")
+    return manifest
+
+
+# dump a collection page by page, only one page is held in memory. the vectors are
+# written straight into a preallocated memory-mapped .npy file
+def export_snapshot(collection: Collection, path: str, dtype: str = "float32", batch_size: int = 1000) -> dict:
+    if dtype not in SNAPSHOT_DTYPES:
+        raise ValueError(f"snapshot: unsupported dtype {dtype}, expected one of {', '.join(SNAPSHOT_DTYPES)}")
+    os.makedirs(path, exist_ok=True)
+
+    total = collection.count()
+    vectors = None
+    written = 0
+    columns = {c: open(os.path.join(path, f"{c}.jsonl"), "w") for c in COLUMNS}
+    try:
+        while written < total:
+            page = collection.get(include=["embeddings", "documents", "metadatas"],
+                                  limit=min(batch_size, total - written), offset=written)
+            if len(page["ids"]) == 0:
+                # records deleted while exporting
+                break
+            embeddings = np.asarray(page["embeddings"], dtype=np.float32)
+            if vectors is None:
+                vectors = open_memmap(os.path.join(path, "embeddings.npy"), mode="w+", dtype=dtype,
+                                      shape=(total, embeddings.shape[1]))
+            vectors[written:written+len(embeddings)] = embeddings
+            for column in COLUMNS:
+                columns[column].writelines(json.dumps(value) + "\n" for value in page[column])
+            written += len(page["ids"])
+    finally:
+        for f in columns.values():
+            f.close()
+        if vectors is not None:
+            vectors.flush()
+            del vectors
+
+    manifest = {"version": SNAPSHOT_VERSION,
+                "collection": collection.name,
+                "metadata": collection.metadata,
+                "count": written,
+                "dimensions": int(np.load(os.path.join(path, "embeddings.npy"), mmap_mode="r").shape[1]) if written > 0 else 0,
+                "dtype": dtype,
+                "created": time()}
+    with open(os.path.join(path, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+# (id, embedding, metadata, document) records of a snapshot, batch_size at a time.
+# vectors are read from the memory-mapped matrix, so memory stays flat
+def iterate_snapshot(path: str, batch_size: int = 5000, start: int = 0):
+    manifest = read_manifest(path)
+    count = manifest["count"]
+    if count == 0:
+        return
+    vectors = np.load(os.path.join(path, "embeddings.npy"), mmap_mode="r")
+    columns = {c: open(os.path.join(path, f"{c}.jsonl")) for c in COLUMNS}
+    try:
+        for f in columns.values():
+            for _ in islice(f, start):
+                pass
+        for offset in range(start, count, batch_size):
+            size = min(batch_size, count - offset)
+            ids, documents, metadatas = ([json.loads(line) for line in islice(columns[c], size)] for c in COLUMNS)
+            embeddings = np.asarray(vectors[offset:offset+size], dtype=np.float32)
+            yield list(zip(ids, embeddings, metadatas, documents))
+    finally:
+        for f in columns.values():
+            f.close()
+
+
+# bulk load a snapshot into a collection, upserting so that an interrupted import can
+# simply be run again (or continued from start). returns the number of imported records
+def import_snapshot(writer: ChromaWriter, path: str, batch_size: int = 5000, start: int = 0, progress=None) -> int:
+    imported = 0
+    for records in iterate_snapshot(path, batch_size=batch_size, start=start):
+        imported += writer.upsert_records(records)
+        if progress is not None:
+            progress(start + imported)
+    return imported
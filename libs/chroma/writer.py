@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+
+import json
+from time import perf_counter
+from uuid import UUID
+from hashlib import sha256
+from typing import Callable
+from chromadb import Collection
+from llama_index.core.schema import BaseNode, MetadataMode
+from llama_index.core.vector_stores.utils import node_to_metadata_dict
+from libs.utils.tools import sizedBatches
+from libs.utils.metrics import metrics
+
+# metadata of canonical nodes listing the chunks dropped as their duplicates
+DUPLICATE_KEYS = ("duplicate_count", "duplicate_sources")
+
+
+# deterministic node id derived from the chunk source and its position in it,
+# re-ingesting the same document always yields the same ids
+def chunk_id(source: str, ordinal: int) -> str:
+    return str(UUID(bytes=sha256(f"{source}\x00#{ordinal}".encode("utf-8")).digest()[:16]))
+
+
+# assign deterministic ids to split nodes. the source is the parent document
+# (file path and part when loaded with filename_as_id), the position is the
+# ordinal of the chunk within it, so that ids never depend on how the splitter
+# tracks character offsets (repeated chunk texts would collide on those)
+def assign_chunk_ids(nodes: list) -> list:
+    ordinals: dict = {}
+    renamed: dict = {}
+    for node in nodes:
+        source = node.ref_doc_id or node.metadata.get("file_path", "")
+        ordinal = ordinals.get(source, 0)
+        ordinals[source] = ordinal + 1
+        renamed[node.node_id] = chunk_id(source, ordinal)
+        node.id_ = renamed[node.node_id]
+
+    # keep prev/next links between sibling chunks pointing at the new ids
+    for node in nodes:
+        for relation in node.relationships.values():
+            if hasattr(relation, "node_id") and relation.node_id in renamed:
+                relation.node_id = renamed[relation.node_id]
+    return nodes
+
+
+# bulk writer that upserts nodes straight into a chroma collection,
+# batches are sized from the server max batch size and the payload bytes
+class ChromaWriter(object):
+    def __init__(self, collection: Collection,
+                 max_batch_size: int = 5461,
+                 max_payload_bytes: int = 16 * 1024 * 1024):
+        self._collection: Collection = collection
+        self.max_batch_size: int = max(max_batch_size, 1)
+        self.max_payload_bytes: int = max_payload_bytes
+        self.written: int = 0
+
+    # rough size of the upsert payload for a single record
+    def _record_size(self, record: tuple) -> int:
+        node_id, embedding, metadata, document = record
+        return len(node_id) + 4 * len(embedding) + len((document or "").encode("utf-8")) + len(json.dumps(metadata))
+
+    def _record(self, node: BaseNode) -> tuple:
+        metadata = node_to_metadata_dict(node, remove_text=True, flat_metadata=True)
+        for key in metadata:
+            if metadata[key] is None:
+                metadata[key] = ""
+        # chroma merges the metadata of upserted records, a None value drops the
+        # references of a previous version (they are annotated again after the run)
+        for key in DUPLICATE_KEYS:
+            metadata[key] = None
+        return (node.node_id, node.get_embedding(), metadata, node.get_content(metadata_mode=MetadataMode.NONE))
+
+    # compute the embeddings of the nodes that do not carry one yet
+    def embed(self, nodes: list, embed_model: Callable, show_progress: bool = False) -> list:
+        pending = [node for node in nodes if node.embedding is None]
+        if len(pending) > 0:
+            started = perf_counter()
+            vectors = embed_model.get_text_embedding_batch([node.get_content(metadata_mode=MetadataMode.EMBED) for node in pending],
+                                                           show_progress=show_progress)
+            metrics.observe("embedding_latency_seconds", perf_counter() - started)
+            metrics.count("embedded_nodes", len(pending))
+            for node, vector in zip(pending, vectors):
+                node.embedding = vector
+        return nodes
+
+    def upsert(self, nodes: list) -> int:
+        return self.upsert_records([self._record(node) for node in nodes])
+
+    # upsert (id, embedding, metadata, document) records, e.g. read back from a snapshot
+    def upsert_records(self, records: list) -> int:
+        for batch in sizedBatches(records, self.max_batch_size, self.max_payload_bytes, self._record_size):
+            ids, embeddings, metadatas, documents = zip(*batch)
+            started = perf_counter()
+            self._collection.upsert(ids=list(ids),
+                                    embeddings=list(embeddings),
+                                    metadatas=list(metadatas),
+                                    documents=list(documents))
+            metrics.observe("chroma_upsert_seconds", perf_counter() - started)
+            metrics.count("upserted_nodes", len(batch))
+            if metrics.enabled:
+                metrics.count("upserted_bytes", sum(self._record_size(r) for r in batch))
+            self.written += len(batch)
+        return len(records)
+
+    # store duplicate references in the metadata of already written canonical nodes,
+    # nodes without duplicates left (a count of 0) lose their duplicate keys
+    def annotate(self, references: dict) -> int:
+        ids = list(references.keys())
+        annotated: int = 0
+        for k in range(0, len(ids), self.max_batch_size):
+            existing = self._collection.get(ids=ids[k:k+self.max_batch_size], include=[])
+            metadatas = []
+            for node_id in existing["ids"]:
+                count, sources = references[node_id]
+                values = (count, "\n".join(sources)) if count > 0 else (None, None)
+                metadatas.append(dict(zip(DUPLICATE_KEYS, values)))
+            if len(metadatas) > 0:
+                self._collection.update(ids=existing["ids"], metadatas=metadatas)
+                annotated += len(metadatas)
+        return annotated
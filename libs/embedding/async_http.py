@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+
+import asyncio
+import random
+import threading
+from time import perf_counter
+from typing import Callable, List
+import httpx
+from langchain_core.embeddings import Embeddings
+from libs.utils.metrics import metrics
+
+RETRY_STATUS = (408, 429, 500, 502, 503, 504)
+
+
+class EmbeddingRequestError(Exception):
+    pass
+
+
+# concurrent embedding client for ollama and openai-compatible endpoints
+# requests are issued from a dedicated event loop thread through a pooled
+# httpx client, so sync and async callers share the same connection pool
+class AsyncHTTPEmbeddings(Embeddings):
+    def __init__(self, base_url: str = "http://localhost:11434",
+                 model: str = "nomic-embed-text:latest",
+                 api: str = "ollama",
+                 api_key: str = None,
+                 concurrency: int = 8,
+                 batch_size: int = 32,
+                 min_batch_size: int = 1,
+                 max_batch_size: int = 256,
+                 target_latency: float = 2.0,
+                 max_retries: int = 5,
+                 backoff: float = 0.5,
+                 timeout: float = 120.0):
+        if api not in ("ollama", "openai"):
+            raise ValueError(f"AsyncHTTPEmbeddings: unsupported api type {api}")
+        self.base_url: str = base_url.rstrip("/")
+        self.model: str = model
+        self.model_name: str = model
+        self.api: str = api
+        self.api_key: str = api_key
+        self.concurrency: int = max(concurrency, 1)
+        self.min_batch_size: int = max(min_batch_size, 1)
+        self.max_batch_size: int = max(max_batch_size, self.min_batch_size)
+        self.target_latency: float = target_latency
+        self.max_retries: int = max_retries
+        self.backoff: float = backoff
+        self.timeout: float = timeout
+        self._batch_size: int = min(max(batch_size, self.min_batch_size), self.max_batch_size)
+
+        # throughput counters
+        self._stats_lock = threading.Lock()
+        self.requests: int = 0
+        self.texts: int = 0
+        self.retries: int = 0
+        self.request_time: float = 0.0
+        self.wall_time: float = 0.0
+
+        # background event loop owning the http connection pool
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="embedding-io", daemon=True)
+        self._thread.start()
+        self._client: httpx.AsyncClient = self._submit(self._open()).result()
+
+    async def _open(self) -> httpx.AsyncClient:
+        self._slots = asyncio.Semaphore(self.concurrency)
+        headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+        return httpx.AsyncClient(base_url=self.base_url,
+                                 headers=headers,
+                                 timeout=self.timeout,
+                                 limits=httpx.Limits(max_connections=self.concurrency,
+                                                     max_keepalive_connections=self.concurrency))
+
+    def _submit(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+
+    def _request(self, texts: List[str]) -> tuple:
+        if self.api == "ollama":
+            return "/api/embed", {"model": self.model, "input": texts}
+        else:
+            return "/embeddings", {"model": self.model, "input": texts}
+
+    def _response(self, payload: dict) -> List[List[float]]:
+        if self.api == "ollama":
+            return payload["embeddings"]
+        else:
+            return [item["embedding"] for item in sorted(payload["data"], key=lambda i: i["index"])]
+
+    # additive increase / multiplicative decrease of the request batch size
+    def _adapt(self, latency: float, overloaded: bool = False):
+        if overloaded or latency > 2 * self.target_latency:
+            self._batch_size = max(self.min_batch_size, self._batch_size // 2)
+        elif latency < self.target_latency:
+            self._batch_size = min(self.max_batch_size, self._batch_size + max(self._batch_size // 4, 1))
+
+    async def _post(self, texts: List[str]) -> List[List[float]]:
+        path, body = self._request(texts)
+        for attempt in range(self.max_retries + 1):
+            started = perf_counter()
+            try:
+                response = await self._client.post(path, json=body)
+            except (httpx.TimeoutException, httpx.TransportError) as e:
+                if attempt == self.max_retries:
+                    raise EmbeddingRequestError(f"AsyncHTTPEmbeddings: {path} failed after {attempt + 1} attempts: {e}")
+                self._adapt(self.timeout, overloaded=True)
+                delay = None
+            else:
+                latency = perf_counter() - started
+                metrics.observe("embedding_request_seconds", latency)
+                with self._stats_lock:
+                    self.requests += 1
+                    self.request_time += latency
+                if response.status_code == 413 and len(texts) > 1:
+                    # payload too large: shrink and split this batch in two
+                    self._adapt(latency, overloaded=True)
+                    middle = len(texts) // 2
+                    return (await self._post(texts[:middle])) + (await self._post(texts[middle:]))
+                if response.status_code not in RETRY_STATUS:
+                    response.raise_for_status()
+                    vectors = self._response(response.json())
+                    if len(vectors) != len(texts):
+                        raise EmbeddingRequestError(f"AsyncHTTPEmbeddings: expected {len(texts)} embeddings, got {len(vectors)}")
+                    self._adapt(latency)
+                    metrics.count("embedding_requests")
+                    metrics.count("embedding_texts", len(texts))
+                    with self._stats_lock:
+                        self.texts += len(texts)
+                    return vectors
+                if attempt == self.max_retries:
+                    raise EmbeddingRequestError(f"AsyncHTTPEmbeddings: {path} returned {response.status_code} after {attempt + 1} attempts")
+                self._adapt(latency, overloaded=True)
+                delay = response.headers.get("Retry-After")
+
+            # exponential backoff with jitter, honour Retry-After when the server sends it
+            metrics.count("embedding_retries")
+            with self._stats_lock:
+                self.retries += 1
+            try:
+                delay = float(delay)
+            except (TypeError, ValueError):
+                delay = self.backoff * (2 ** attempt) * (0.5 + random.random())
+            await asyncio.sleep(delay)
+
+    async def _run_batch(self, offset: int, texts: List[str], results: list):
+        try:
+            results[offset:offset+len(texts)] = await self._post(texts)
+        finally:
+            self._slots.release()
+
+    async def _embed(self, texts: List[str]) -> List[List[float]]:
+        started = perf_counter()
+        results: list = [None] * len(texts)
+        tasks: list = []
+        position: int = 0
+        # batches are cut at dispatch time so they follow the current adaptive size
+        while position < len(texts):
+            await self._slots.acquire()
+            chunk = texts[position:position+self._batch_size]
+            tasks.append(asyncio.create_task(self._run_batch(position, chunk, results)))
+            position += len(chunk)
+        try:
+            await asyncio.gather(*tasks)
+        except Exception:
+            for task in tasks:
+                task.cancel()
+            raise
+        finally:
+            with self._stats_lock:
+                self.wall_time += perf_counter() - started
+        return results
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if len(texts) == 0:
+            return []
+        return self._submit(self._embed(list(texts))).result()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        if len(texts) == 0:
+            return []
+        return await asyncio.wrap_future(self._submit(self._embed(list(texts))))
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
+
+    def report(self) -> dict:
+        with self._stats_lock:
+            return {"requests": self.requests,
+                    "texts": self.texts,
+                    "retries": self.retries,
+                    "batch_size": self._batch_size,
+                    "mean_latency": (self.request_time / self.requests) if self.requests > 0 else 0.0,
+                    "texts_per_second": (self.texts / self.wall_time) if self.wall_time > 0 else 0.0}
+
+    def close(self):
+        if self._loop.is_running():
+            self._submit(self._client.aclose()).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+
+    def __str__(self) -> str:
+        return f"AsyncHTTPEmbeddings: {self.api} {self.base_url} - Model: {self.model} - Concurrency: {self.concurrency}"
+
+
+def async_ollama_instance(base_url="http://localhost:11434", model="llama2:7b", **kwargs) -> Callable:
+    return AsyncHTTPEmbeddings(base_url=base_url, model=model, api="ollama", **kwargs)
+
+
+def async_openai_instance(base_url="http://localhost:11434", model="llama2:7b", api_key=None, **kwargs) -> Callable:
+    return AsyncHTTPEmbeddings(base_url=base_url, model=model, api="openai", api_key=api_key, **kwargs)
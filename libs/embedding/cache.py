@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+
+import os
+import sqlite3
+import threading
+from time import time_ns
+from hashlib import sha256
+from typing import List
+from numpy import asarray, frombuffer, float32
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.bridge.pydantic import PrivateAttr
+from libs.utils.metrics import metrics
+
+
+def text_digest(text: str) -> str:
+    return sha256(text.encode("utf-8", errors="surrogatepass")).hexdigest()
+
+
+# persistent, content-addressed embedding store backed by sqlite
+# vectors are stored as raw float32 blobs keyed by (model id, sha256(text))
+# and evicted in least-recently-used order once max_entries is exceeded
+class EmbeddingCache(object):
+    def __init__(self, path: str = "./embeddings.cache", max_entries: int = 1000000):
+        if max_entries <= 0:
+            raise ValueError(f"EmbeddingCache: max_entries must be positive, got {max_entries}")
+        self.path: str = path
+        self.max_entries: int = max_entries
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+        # the same cache is shared between the splitter and the indexer, possibly from worker threads
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("""CREATE TABLE IF NOT EXISTS embeddings (
+                                model TEXT NOT NULL,
+                                digest TEXT NOT NULL,
+                                vector BLOB NOT NULL,
+                                last_used INTEGER NOT NULL,
+                                PRIMARY KEY (model, digest)) WITHOUT ROWID""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS embeddings_lru ON embeddings (last_used)")
+        self._db.commit()
+        self._entries: int = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def __len__(self) -> int:
+        return self._entries
+
+    def get_many(self, model: str, digests: List[str]) -> dict:
+        found: dict = {}
+        if len(digests) == 0:
+            return found
+
+        with self._lock:
+            # sqlite caps the number of bound parameters, query in slices
+            unique_digests = list(set(digests))
+            for k in range(0, len(unique_digests), 500):
+                chunk = unique_digests[k:k+500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._db.execute(f"SELECT digest, vector FROM embeddings WHERE model = ? AND digest IN ({placeholders})",
+                                        [model, *chunk])
+                for digest, blob in rows:
+                    found[digest] = frombuffer(blob, dtype=float32).tolist()
+
+            # refresh recency of every hit
+            if len(found) > 0:
+                now = time_ns()
+                self._db.executemany("UPDATE embeddings SET last_used = ? WHERE model = ? AND digest = ?",
+                                     [(now, model, d) for d in found.keys()])
+                self._db.commit()
+
+        hits = sum(1 for d in digests if d in found)
+        self.hits += hits
+        self.misses += len(digests) - hits
+        metrics.count("cache_hits", hits)
+        metrics.count("cache_misses", len(digests) - hits)
+        return found
+
+    def put_many(self, model: str, items: dict) -> None:
+        if len(items) == 0:
+            return
+
+        now = time_ns()
+        rows = [(model, digest, asarray(vector, dtype=float32).tobytes(), now) for digest, vector in items.items()]
+        with self._lock:
+            cursor = self._db.executemany("INSERT OR IGNORE INTO embeddings (model, digest, vector, last_used) VALUES (?, ?, ?, ?)", rows)
+            self._entries += max(cursor.rowcount, 0)
+            overflow = self._entries - self.max_entries
+            if overflow > 0:
+                self._db.execute("""DELETE FROM embeddings WHERE (model, digest) IN
+                                    (SELECT model, digest FROM embeddings ORDER BY last_used ASC LIMIT ?)""", (overflow,))
+                self._entries -= overflow
+                self.evictions += overflow
+                metrics.count("cache_evictions", overflow)
+            self._db.commit()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {"entries": self._entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits / lookups) if lookups > 0 else 0.0}
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def __str__(self) -> str:
+        return f"EmbeddingCache: {self.path} - {self._entries}/{self.max_entries} entries - {self.hits} hits, {self.misses} misses"
+
+
+# llamaindex embedding model that answers from an EmbeddingCache and
+# only forwards cache misses to the wrapped model, all of them in a single call
+class CachedEmbedding(BaseEmbedding):
+    _embedder: BaseEmbedding = PrivateAttr()
+    _cache: EmbeddingCache = PrivateAttr()
+
+    def __init__(self, embedder: BaseEmbedding, cache: EmbeddingCache, embed_batch_size: int = None):
+        super().__init__(model_name=embedder.model_name,
+                         embed_batch_size=embed_batch_size or embedder.embed_batch_size,
+                         callback_manager=embedder.callback_manager)
+        self._embedder = embedder
+        self._cache = cache
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CachedEmbedding"
+
+    def Cache(self) -> EmbeddingCache:
+        return self._cache
+
+    def Embedder(self) -> BaseEmbedding:
+        return self._embedder
+
+    def _lookup(self, texts: List[str]) -> tuple:
+        digests = [text_digest(t) for t in texts]
+        found = self._cache.get_many(self.model_name, digests)
+        # embed every distinct missing text only once
+        missing: dict = {}
+        for text, digest in zip(texts, digests):
+            if digest not in found and digest not in missing:
+                missing[digest] = text
+        return digests, found, missing
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        digests, found, missing = self._lookup(texts)
+        if len(missing) > 0:
+            vectors = self._embedder.get_text_embedding_batch(list(missing.values()))
+            computed = dict(zip(missing.keys(), vectors))
+            self._cache.put_many(self.model_name, computed)
+            found.update(computed)
+        return [found[d] for d in digests]
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        digests, found, missing = self._lookup(texts)
+        if len(missing) > 0:
+            vectors = await self._embedder.aget_text_embedding_batch(list(missing.values()))
+            computed = dict(zip(missing.keys(), vectors))
+            self._cache.put_many(self.model_name, computed)
+            found.update(computed)
+        return [found[d] for d in digests]
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._get_text_embeddings([text])[0]
+
+    async def _aget_text_embedding(self, text: str) -> List[float]:
+        return (await self._aget_text_embeddings([text]))[0]
+
+    # query embeddings may use a different prompt than documents, never cache them
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._embedder.get_query_embedding(query)
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return await self._embedder.aget_query_embedding(query)
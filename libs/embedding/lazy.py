@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+
+import threading
+from typing import Callable, List
+from langchain_core.embeddings import Embeddings
+
+
+# langchain embeddings proxy that imports and builds the real model on first use,
+# so that startup, --check and runs with nothing to ingest never load a model.
+# model_name must match the name of the real model, it keys the embedding cache
+class LazyEmbeddings(Embeddings):
+    def __init__(self, factory: Callable, model_name: str):
+        self.model_name: str = model_name
+        self._factory: Callable = factory
+        self._model: Embeddings = None
+        self._lock = threading.Lock()
+
+    def Model(self) -> Embeddings:
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    self._model = self._factory()
+        return self._model
+
+    def loaded(self) -> bool:
+        return self._model is not None
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.Model().embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.Model().embed_query(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.Model().aembed_documents(texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await self.Model().aembed_query(text)
+
+    # optional hooks of the wrapped model (report, close), only once it is loaded
+    def __getattr__(self, name: str):
+        if name.startswith("_") or self.__dict__.get("_model") is None:
+            raise AttributeError(name)
+        return getattr(self._model, name)
+
+    def __str__(self) -> str:
+        return f"LazyEmbeddings: {self.model_name} - loaded: {self.loaded()}"
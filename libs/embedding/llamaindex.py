@@ -3,6 +3,22 @@
 from llama_index.embeddings.langchain import LangchainEmbedding
 from typing import Callable
 
+# upper bound of BaseEmbedding.embed_batch_size in llamaindex
+MAX_EMBED_BATCH_SIZE: int = 2048
 
-def LlamaIndexEmbedding(langchain_embedding_adapter: Callable) -> Callable:
-    return LangchainEmbedding(langchain_embedding_adapter)
+
+def LlamaIndexEmbedding(langchain_embedding_adapter: Callable,
+                        cache_path: str = None,
+                        cache_entries: int = 1000000,
+                        embed_batch_size: int = MAX_EMBED_BATCH_SIZE) -> Callable:
+    # texts handed to the embedding model per call, the llamaindex default (10) would
+    # serialize the model into tiny batches
+    embed_batch_size = max(min(embed_batch_size, MAX_EMBED_BATCH_SIZE), 1)
+    embedder = LangchainEmbedding(langchain_embedding_adapter, embed_batch_size=embed_batch_size)
+    if cache_path is None:
+        return embedder
+
+    # wrap the model with the persistent embedding cache
+    from libs.embedding.cache import EmbeddingCache, CachedEmbedding
+    return CachedEmbedding(embedder, EmbeddingCache(path=cache_path, max_entries=cache_entries),
+                           embed_batch_size=embed_batch_size)
@@ -1,6 +1,97 @@
 #!/usr/bin/env python
 
-from langchain_huggingface import HuggingFaceEmbeddings as hfe
+import os
+import inspect
+from typing import List
+from numpy import argsort, asarray, ascontiguousarray, empty, float32, ndarray
+from langchain_core.embeddings import Embeddings
 
 def s_transformer(model: str = "all-MiniLM-L6-v2"):
+    from langchain_huggingface import HuggingFaceEmbeddings as hfe
     return hfe(model_name=model)
+
+
+# multi-core local sentence transformer engine
+# texts are sorted by token length and cut in buckets of similar length so that
+# every batch carries little padding, then encoded across a pool of processes
+class SentenceTransformerPool(Embeddings):
+    def __init__(self, model: str = "all-MiniLM-L6-v2",
+                 batch_size: int = 32,
+                 workers: int = 0,
+                 device: str = "cpu",
+                 min_parallel: int = 256,
+                 normalize: bool = False):
+        from sentence_transformers import SentenceTransformer
+
+        self.model_name: str = model
+        self.batch_size: int = max(batch_size, 1)
+        self.workers: int = workers if workers > 0 else (os.cpu_count() or 1)
+        self.device: str = device
+        self.min_parallel: int = min_parallel
+        self.normalize: bool = normalize
+        self._model = SentenceTransformer(model, device=device)
+        self._pool = None
+        # sentence-transformers >= 5 encodes on a pool through encode(pool=...). older
+        # releases forward unknown encode() arguments to the model, which ignores them,
+        # so the pool would silently stay idle: they go through encode_multi_process
+        self._encode_accepts_pool: bool = "pool" in inspect.signature(self._model.encode).parameters
+
+    def _token_lengths(self, texts: List[str]) -> ndarray:
+        tokenizer = getattr(self._model, "tokenizer", None)
+        if tokenizer is None:
+            return asarray([len(t) for t in texts])
+        encoded = tokenizer(texts, add_special_tokens=False, truncation=True,
+                            max_length=self._model.get_max_seq_length() or 512)
+        return asarray([len(ids) for ids in encoded["input_ids"]])
+
+    def _start_pool(self):
+        if self._pool is None:
+            self._pool = self._model.start_multi_process_pool(target_devices=[self.device] * self.workers)
+        return self._pool
+
+    def _encode_sorted(self, texts: List[str]) -> ndarray:
+        options = {"batch_size": self.batch_size,
+                   "convert_to_numpy": True,
+                   "normalize_embeddings": self.normalize}
+        if self.workers == 1 or len(texts) < self.min_parallel:
+            return self._model.encode(texts, show_progress_bar=False, **options)
+
+        # each worker receives a run of whole length buckets
+        chunk_size = self.batch_size * max(len(texts) // (self.batch_size * self.workers * 4), 1)
+        pool = self._start_pool()
+        if self._encode_accepts_pool:
+            return self._model.encode(texts, pool=pool, chunk_size=chunk_size, **options)
+        return self._model.encode_multi_process(texts, pool, batch_size=self.batch_size,
+                                                chunk_size=chunk_size,
+                                                normalize_embeddings=self.normalize)
+
+    # returns a contiguous float32 array in the same order as the input texts
+    def encode(self, texts: List[str]) -> ndarray:
+        if len(texts) == 0:
+            return empty((0, self._model.get_sentence_embedding_dimension()), dtype=float32)
+
+        order = argsort(self._token_lengths(texts), kind="stable")
+        vectors = self._encode_sorted([texts[i] for i in order])
+
+        # scatter back to the original order
+        result = empty((len(texts), vectors.shape[1]), dtype=float32)
+        result[order] = vectors
+        return ascontiguousarray(result)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.encode(list(texts)).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.encode([text])[0].tolist()
+
+    def close(self):
+        if self._pool is not None:
+            self._model.stop_multi_process_pool(self._pool)
+            self._pool = None
+
+    def __str__(self) -> str:
+        return f"SentenceTransformerPool: {self.model_name} - Workers: {self.workers} - Batch Size: {self.batch_size}"
+
+
+def s_transformer_pool(model: str = "all-MiniLM-L6-v2", batch_size: int = 32, workers: int = 0):
+    return SentenceTransformerPool(model=model, batch_size=batch_size, workers=workers)
@@ -2,44 +2,79 @@
 
 try:
     from llama_index.core import Document
-    from nltk import word_tokenize, sent_tokenize, download
     from prettytable import PrettyTable
-    from tqdm import tqdm
-    import os
-    download("punkt_tab", download_dir=os.environ.get("NLTK_DATA", "/".join((os.environ.get("HOME"), "nltk_data"))))
+    from libs.utils.metrics import metrics
+    from libs.loaders.textstats import corpus_stats, sampled, nltk_data_available
 except Exception as e:
     print(f"Caught Exception {e}")
 
+STATS_MODES = ("full", "sampled", "none")
+
+# statistics stored in the document metadata when stats_metadata is set,
+# hidden from the embedding model and the llm
+STATS_METADATA_KEYS = ["wordcount", "sentence_count", "lexical_richness"]
+
 
 # Prepare data corpus, load from training data set
-def prepare_corpus(raw_loader: list) -> list:
+# stats: full tokenizes every document, sampled a deterministic sample_rate fraction
+# of them, none skips the statistics table. with stats_metadata every document is
+# analyzed and its statistics are persisted as metadata of the generated nodes
+def prepare_corpus(raw_loader: list,
+                   stats: str = "full",
+                   sample_rate: float = 0.1,
+                   workers: int = 1,
+                   stats_metadata: bool = False) -> list:
+    if stats not in STATS_MODES:
+        raise ValueError(f"prepare_corpus: unsupported stats mode {stats}, expected one of {', '.join(STATS_MODES)}")
+
+    # documents without any text produce no nodes
+    documents = [doc for doc in raw_loader if len(doc.get_content().strip()) > 0]
+
+    # statistics need the nltk tokenizer data, which is never downloaded at runtime
+    if (stats_metadata or stats != "none") and len(documents) > 0 and not nltk_data_available():
+        if stats_metadata:
+            raise LookupError("prepare_corpus: stats_metadata requires the nltk punkt_tab data (python -m nltk.downloader punkt_tab)")
+        print("NLTK punkt_tab data not found, skipping corpus statistics (python -m nltk.downloader punkt_tab)")
+        stats = "none"
+
     # collect statistics in relation to the data corpus
-    corpus = []
-    for doc in raw_loader:
-        page_content = doc.get_content()
-        document_tokens = word_tokenize(page_content)
-        document_sentences = sent_tokenize(page_content)
-        if (len(document_tokens) != 0) and (len(document_sentences) != 0):
-            corpus.append({"metadata": doc.metadata,
-                           "raw_sentences": document_sentences,
-                           "page_content": page_content,
-                           "sentence_count": len(document_sentences),
-                           "wordcount": len(document_tokens),
-                           "vocabulary": set(document_tokens),
-                           "lexical_richness": len(set(document_tokens)) / len(document_tokens)})
+    if stats_metadata or stats == "full":
+        analyzed = documents
+    elif stats == "sampled":
+        analyzed = [doc for doc in documents if sampled(doc.id_, sample_rate)]
+    else:
+        analyzed = []
+
+    with metrics.timer("tokenize"):
+        statistics = corpus_stats([doc.get_content() for doc in analyzed], workers=workers)
+    statistics = dict(zip([doc.id_ for doc in analyzed], statistics))
 
     # display corpus
-    data_table = PrettyTable()
-    data_table.field_names = ["Dataset", "Word Count", "Sentence Count", "Vocabulary", "Lexical Richness", "File Type"]
-    for dataset in corpus:
-        data_table.add_row([dataset.get("metadata").get("file_name"), dataset.get("wordcount"), dataset.get("sentence_count"), len(dataset.get("vocabulary")), dataset.get("lexical_richness"), dataset.get("metadata").get("file_type")])
+    if stats != "none" and len(documents) > 0:
+        data_table = PrettyTable()
+        data_table.field_names = ["Dataset", "Word Count", "Sentence Count", "Vocabulary", "Lexical Richness", "File Type"]
+        for doc in analyzed:
+            if stats == "full" or sampled(doc.id_, sample_rate):
+                s = statistics.get(doc.id_)
+                data_table.add_row([doc.metadata.get("file_name"), s.get("wordcount"), s.get("sentence_count"), s.get("vocabulary"), s.get("lexical_richness"), doc.metadata.get("file_type")])
 
-    # display dataset statistics
-    print(data_table)
+        # display dataset statistics
+        print(data_table)
+        if stats == "sampled":
+            rows = len(data_table.rows)
+            words = sum(r[1] for r in data_table.rows)
+            estimate = int(words * len(documents) / rows) if rows > 0 else 0
+            print(f"Sampled {rows}/{len(documents)} documents, estimated corpus word count: {estimate}")
 
-    # return processed data
+    # return processed data, keeping the loader document ids so that chunk ids stay deterministic
     prepared_data = []
-    for doc in tqdm(corpus, ascii=True, desc="Preparing..."):
-        doc_metadata = doc.get("metadata")
-        prepared_data.append(Document(metadata=doc_metadata, text=doc.get("page_content")))
+    for doc in documents:
+        metadata = dict(doc.metadata)
+        if stats_metadata:
+            metadata.update({k: statistics[doc.id_][k] for k in STATS_METADATA_KEYS})
+        prepared_data.append(Document(id_=doc.id_,
+                                      metadata=metadata,
+                                      text=doc.get_content(),
+                                      excluded_embed_metadata_keys=doc.excluded_embed_metadata_keys + (STATS_METADATA_KEYS if stats_metadata else []),
+                                      excluded_llm_metadata_keys=doc.excluded_llm_metadata_keys + (STATS_METADATA_KEYS if stats_metadata else [])))
     return prepared_data
@@ -1,27 +1,77 @@
 #!/usr/bin/env python
 
+from time import perf_counter
 from llama_index.core import SimpleDirectoryReader
+from libs.utils.metrics import metrics
+
+
+def _account(documents: list):
+    metrics.count("loaded_documents", len(documents))
+    metrics.count("loaded_bytes", sum(len(d.text.encode("utf-8")) for d in documents) if metrics.enabled else 0)
 
 
 def dirLoader(data_path: str = None, extensions: str = [".txt"]) -> SimpleDirectoryReader:
     if data_path is not None:
         return SimpleDirectoryReader(input_dir=data_path,
                                      required_exts=extensions,
-                                     recursive=True)
+                                     recursive=True,
+                                     filename_as_id=True)
+    else:
+        return None
+
+
+def fileLoader(files: list = None) -> SimpleDirectoryReader:
+    if files is not None and len(files) > 0:
+        return SimpleDirectoryReader(input_files=files, filename_as_id=True)
+    else:
+        return None
+
+
+def sourceLoader(files: list = None, data_types: dict = {}, **options):
+    if files is not None and len(files) > 0:
+        from libs.loaders.sources import SourceLoader
+        return SourceLoader(files, data_types, **options)
     else:
         return None
 
 
 def loadDocuments(loader: SimpleDirectoryReader = None):
     if loader is not None:
-        return loader.load_data()
+        with metrics.timer("load"):
+            documents = loader.load_data()
+        metrics.count("loaded_files", len(loader.input_files))
+        _account(documents)
+        return documents
     else:
         return []
 
 
 def iterate(loader: SimpleDirectoryReader = None):
     if loader is not None:
-        for document in loader.iter_data():
+        documents = loader.iter_data()
+        while True:
+            # only the time spent inside the loader counts as load time
+            started = perf_counter()
+            document = next(documents, None)
+            metrics.record_time("load", perf_counter() - started)
+            if document is None:
+                break
+            metrics.count("loaded_files")
+            _account(document)
             yield document
     else:
         return None
+
+
+# group the per-file document lists yielded by iterate() into windows of
+# about window_size documents. windows never split a file, so a single file
+# larger than the window is yielded on its own
+def iterateWindows(loader: SimpleDirectoryReader = None, window_size: int = 64):
+    window: list = []
+    for documents in iterate(loader):
+        window.extend(documents)
+        if len(window) >= window_size:
+            yield window
+            window = []
+    if len(window) > 0:
+        yield window
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+
+import os
+import json
+import sqlite3
+from time import time
+from hashlib import sha256
+
+
+# stable key for a run configuration: runs with the same data, target
+# collection, embedding model and splitter share their journal. only values
+# that change the written nodes belong in config, tuning knobs (timeouts,
+# concurrency, batch sizes) must not keep an interrupted run from resuming
+def run_key(config: dict) -> str:
+    return sha256(json.dumps(config, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+# durable journal of the files whose nodes are committed to the collection,
+# a resumed run skips them and continues with the first incomplete batch
+class IngestJournal(object):
+    def __init__(self, path: str = "./ingest.journal.sqlite", key: str = "default"):
+        self.path: str = path
+        self.key: str = key
+
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=FULL")
+        self._db.execute("""CREATE TABLE IF NOT EXISTS runs (
+                                key TEXT PRIMARY KEY,
+                                started REAL NOT NULL,
+                                finished REAL)""")
+        self._db.execute("""CREATE TABLE IF NOT EXISTS completed (
+                                key TEXT NOT NULL,
+                                path TEXT NOT NULL,
+                                nodes INTEGER NOT NULL,
+                                PRIMARY KEY (key, path))""")
+        self._db.commit()
+
+    # start or resume the run, returns the number of files already completed
+    def start(self, resume: bool = False) -> int:
+        if not resume:
+            self._db.execute("DELETE FROM completed WHERE key = ?", (self.key,))
+            self._db.execute("INSERT OR REPLACE INTO runs (key, started, finished) VALUES (?, ?, NULL)", (self.key, time()))
+        else:
+            self._db.execute("INSERT OR IGNORE INTO runs (key, started, finished) VALUES (?, ?, NULL)", (self.key, time()))
+        self._db.commit()
+        return len(self.completed())
+
+    # a run can be resumed when it was started and never finished
+    def resumable(self) -> bool:
+        row = self._db.execute("SELECT finished FROM runs WHERE key = ?", (self.key,)).fetchone()
+        return row is not None and row[0] is None
+
+    # every run of the journal with its number of committed files
+    def runs(self) -> list:
+        rows = self._db.execute("""SELECT r.key, r.started, r.finished, (SELECT COUNT(*) FROM completed c WHERE c.key = r.key)
+                                   FROM runs r ORDER BY r.started""")
+        return [{"key": key, "started": started, "finished": finished, "completed": completed}
+                for key, started, finished, completed in rows]
+
+    def completed(self) -> set:
+        rows = self._db.execute("SELECT path FROM completed WHERE key = ?", (self.key,))
+        return set(r[0] for r in rows)
+
+    def finished(self) -> bool:
+        row = self._db.execute("SELECT finished FROM runs WHERE key = ?", (self.key,)).fetchone()
+        return row is not None and row[0] is not None
+
+    def mark(self, paths: list, nodes: dict = {}) -> None:
+        self._db.executemany("INSERT OR REPLACE INTO completed (key, path, nodes) VALUES (?, ?, ?)",
+                             [(self.key, str(p), nodes.get(p, 0)) for p in paths])
+        self._db.commit()
+
+    def finish(self) -> None:
+        self._db.execute("UPDATE runs SET finished = ? WHERE key = ?", (time(), self.key))
+        self._db.commit()
+
+    def close(self) -> None:
+        self._db.close()
+
+    def __str__(self) -> str:
+        return f"IngestJournal: {self.path} - Run: {self.key[:12]}"
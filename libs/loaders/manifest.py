@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+
+import os
+import sqlite3
+from hashlib import sha256
+
+
+def file_digest(path: str, blocksize: int = 1 << 20) -> str:
+    hasher = sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(blocksize), b""):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+# ingestion manifest: tracks (path, size, mtime, content hash) -> node ids
+# for every file ingested into a collection, so that subsequent runs only
+# process new or modified files and can drop the nodes of stale ones.
+# chunks of a file dropped as duplicates are tracked with the id of the
+# canonical node they were folded into, possibly in another file
+class IngestManifest(object):
+    def __init__(self, path: str = "./ingest.manifest.sqlite", scope: str = "default"):
+        self.path: str = path
+        self.scope: str = scope
+
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+        # several queue workers may share the manifest, wait for their writes
+        self._db = sqlite3.connect(self.path, timeout=60, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""CREATE TABLE IF NOT EXISTS files (
+                                scope TEXT NOT NULL,
+                                path TEXT NOT NULL,
+                                size INTEGER NOT NULL,
+                                mtime INTEGER NOT NULL,
+                                digest TEXT NOT NULL,
+                                PRIMARY KEY (scope, path))""")
+        self._db.execute("""CREATE TABLE IF NOT EXISTS nodes (
+                                scope TEXT NOT NULL,
+                                path TEXT NOT NULL,
+                                node_id TEXT NOT NULL)""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS nodes_by_path ON nodes (scope, path)")
+        self._db.execute("""CREATE TABLE IF NOT EXISTS duplicates (
+                                scope TEXT NOT NULL,
+                                path TEXT NOT NULL,
+                                canonical TEXT NOT NULL,
+                                reference TEXT NOT NULL)""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS duplicates_by_path ON duplicates (scope, path)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS duplicates_by_canonical ON duplicates (scope, canonical)")
+        self._db.commit()
+
+    def files(self) -> dict:
+        rows = self._db.execute("SELECT path, size, mtime, digest FROM files WHERE scope = ?", (self.scope,))
+        return {path: (size, mtime, digest) for path, size, mtime, digest in rows}
+
+    # compare the files on disk with the manifest
+    # returns (changed, removed): changed maps path -> (size, mtime, digest) for new or
+    # modified files, removed lists the manifest paths no longer present on disk
+    def diff(self, paths: list) -> tuple:
+        known: dict = self.files()
+        changed: dict = {}
+        touched: list = []
+        for path in paths:
+            path = str(path)
+            st = os.stat(path)
+            previous = known.get(path)
+            # same size and mtime: assume unchanged without reading the file
+            if previous is not None and previous[0] == st.st_size and previous[1] == st.st_mtime_ns:
+                continue
+            digest = file_digest(path)
+            # touched but identical content, only refresh the stat info
+            if previous is not None and previous[2] == digest:
+                touched.append((st.st_size, st.st_mtime_ns, self.scope, path))
+                continue
+            changed[path] = (st.st_size, st.st_mtime_ns, digest)
+
+        if len(touched) > 0:
+            self._db.executemany("UPDATE files SET size = ?, mtime = ? WHERE scope = ? AND path = ?", touched)
+            self._db.commit()
+
+        on_disk = set(str(p) for p in paths)
+        removed = [p for p in known.keys() if p not in on_disk]
+        return changed, removed
+
+    def node_ids(self, paths: list) -> list:
+        ids: list = []
+        for path in paths:
+            rows = self._db.execute("SELECT node_id FROM nodes WHERE scope = ? AND path = ?", (self.scope, str(path)))
+            ids.extend(r[0] for r in rows)
+        return ids
+
+    # files whose dropped duplicates were folded into one of the given nodes
+    def dependents(self, node_ids: list) -> list:
+        paths: set = set()
+        node_ids = list(node_ids)
+        for k in range(0, len(node_ids), 500):
+            chunk = node_ids[k:k+500]
+            rows = self._db.execute(f"SELECT DISTINCT path FROM duplicates WHERE scope = ? AND canonical IN ({','.join('?' * len(chunk))})",
+                                    (self.scope, *chunk))
+            paths.update(r[0] for r in rows)
+        return sorted(paths)
+
+    # canonical nodes referenced by the duplicates of the given files
+    def canonicals(self, paths: list) -> set:
+        ids: set = set()
+        for path in paths:
+            rows = self._db.execute("SELECT canonical FROM duplicates WHERE scope = ? AND path = ?", (self.scope, str(path)))
+            ids.update(r[0] for r in rows)
+        return ids
+
+    # canonical node id -> (duplicate count, first max_references duplicate sources), over every recorded file
+    def references(self, node_ids: list, max_references: int = 32) -> dict:
+        references: dict = {node_id: (0, []) for node_id in node_ids}
+        for node_id in references:
+            rows = self._db.execute("SELECT reference FROM duplicates WHERE scope = ? AND canonical = ? ORDER BY path, reference",
+                                    (self.scope, node_id)).fetchall()
+            references[node_id] = (len(rows), [r[0] for r in rows[:max_references]])
+        return references
+
+    # force the files to be seen as modified by the next diff, keeping their
+    # nodes so that they are still replaced when the files are ingested again
+    def invalidate(self, paths: list) -> None:
+        self._db.executemany("UPDATE files SET size = -1, digest = '' WHERE scope = ? AND path = ?",
+                             [(self.scope, str(p)) for p in paths])
+        self._db.commit()
+
+    # record the nodes produced for a file and the (canonical id, reference) of the
+    # chunks dropped as duplicates, replacing any previous entry
+    def record(self, path: str, size: int, mtime: int, digest: str, node_ids: list, duplicates: list = []) -> None:
+        path = str(path)
+        self._db.execute("DELETE FROM nodes WHERE scope = ? AND path = ?", (self.scope, path))
+        self._db.execute("DELETE FROM duplicates WHERE scope = ? AND path = ?", (self.scope, path))
+        self._db.execute("INSERT OR REPLACE INTO files (scope, path, size, mtime, digest) VALUES (?, ?, ?, ?, ?)",
+                         (self.scope, path, size, mtime, digest))
+        self._db.executemany("INSERT INTO nodes (scope, path, node_id) VALUES (?, ?, ?)",
+                             [(self.scope, path, node_id) for node_id in node_ids])
+        self._db.executemany("INSERT INTO duplicates (scope, path, canonical, reference) VALUES (?, ?, ?, ?)",
+                             [(self.scope, path, canonical, reference) for canonical, reference in duplicates])
+        self._db.commit()
+
+    def forget(self, paths: list) -> None:
+        for path in paths:
+            self._db.execute("DELETE FROM nodes WHERE scope = ? AND path = ?", (self.scope, str(path)))
+            self._db.execute("DELETE FROM duplicates WHERE scope = ? AND path = ?", (self.scope, str(path)))
+            self._db.execute("DELETE FROM files WHERE scope = ? AND path = ?", (self.scope, str(path)))
+        self._db.commit()
+
+    def close(self) -> None:
+        self._db.close()
+
+    def __str__(self) -> str:
+        return f"IngestManifest: {self.path} - Scope: {self.scope}"
@@ -0,0 +1,13 @@
+#!/usr/bin/env python
+
+# pdf text extraction worker. this module only depends on pypdf so that
+# spawned loader processes start quickly
+
+
+# one (page label, text) tuple per page
+def extract_pdf_pages(path: str) -> list:
+    from pypdf import PdfReader
+    reader = PdfReader(path)
+    labels = reader.page_labels
+    return [(labels[k] if k < len(labels) else str(k + 1), page.extract_text() or "")
+            for k, page in enumerate(reader.pages)]
@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+
+import os
+import mmap
+from glob import iglob
+from time import perf_counter
+from collections import deque
+from multiprocessing import get_context
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from llama_index.core import Document
+from llama_index.core.readers.file.base import default_file_metadata_func
+from libs.utils.metrics import metrics
+from libs.loaders.pdfworker import extract_pdf_pages
+
+# file metadata kept out of the embedding and llm text, as SimpleDirectoryReader does
+EXCLUDED_METADATA_KEYS = ["file_name", "file_type", "file_size", "creation_date", "last_modified_date", "last_accessed_date"]
+
+
+# glob the configured training_data.sources, yielding (path, data_type). the ingestor
+# collects the whole walk before loading anything, since the manifest diff, the shard
+# selection and the work queue all need the complete file list. a file matched by
+# several sources is yielded once
+def discoverSources(sources: list):
+    seen: set = set()
+    for source in sources:
+        for path in iglob(os.path.join(source.get("path"), source.get("pattern", "**/*")), recursive=True):
+            if path in seen or not os.path.isfile(path):
+                continue
+            seen.add(path)
+            yield path, source.get("data_type", "text")
+
+
+def _document(text: str, metadata: dict, id_: str) -> Document:
+    return Document(id_=id_, text=text, metadata=metadata,
+                    excluded_embed_metadata_keys=list(EXCLUDED_METADATA_KEYS),
+                    excluded_llm_metadata_keys=list(EXCLUDED_METADATA_KEYS))
+
+
+# buffered read, memory-mapped above mmap_threshold bytes so that large files are
+# decoded straight from the page cache without an intermediate bytes copy
+def readText(path: str, mmap_threshold: int = 1 << 20) -> list:
+    size = os.path.getsize(path)
+    if size == 0:
+        # empty files cannot be mapped
+        return [_document("", default_file_metadata_func(path), path)]
+    with open(path, "rb", buffering=1 << 16) as f:
+        if size >= mmap_threshold:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                text = str(memoryview(m), "utf-8", "ignore")
+        else:
+            text = f.read().decode("utf-8", errors="ignore")
+    return [_document(text, default_file_metadata_func(path), path)]
+
+
+# one document per pdf page, with the page label in the metadata
+def pdfDocuments(path: str, pages: list) -> list:
+    metadata = default_file_metadata_func(path)
+    return [_document(text, {"page_label": label, **metadata}, f"{path}_part_{k}") for k, (label, text) in enumerate(pages)]
+
+
+# loader over the files discovered from training_data.sources, exposing the
+# SimpleDirectoryReader interface used by dirloader (input_files, iter_data, load_data).
+# text files are read in the calling thread while pdfs are extracted by a process
+# pool; a pdf that takes longer than pdf_timeout seconds is skipped and its worker
+# replaced, so a pathological file never stalls the run
+class SourceLoader(object):
+    def __init__(self, files: list, data_types: dict,
+                 pdf_workers: int = 0,
+                 pdf_timeout: float = 120.0,
+                 mmap_threshold: int = 1 << 20):
+        self.input_files: list = list(files)
+        self.data_types: dict = data_types
+        self.pdf_workers: int = pdf_workers if pdf_workers > 0 else (os.cpu_count() or 1)
+        self.pdf_timeout: float = pdf_timeout
+        self.mmap_threshold: int = mmap_threshold
+        self.skipped: list = []
+        self._pool: ProcessPoolExecutor = None
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.pdf_workers, mp_context=get_context("spawn"))
+        return self._pool
+
+    # terminate the pool, the only way to stop an extraction that went over its timeout
+    def _kill_pool(self):
+        if self._pool is not None:
+            for process in list((self._pool._processes or {}).values()):
+                process.terminate()
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def _load(self, path: str) -> list:
+        data_type = self.data_types.get(path, "text")
+        if data_type == "text":
+            return readText(path, mmap_threshold=self.mmap_threshold)
+        # any other type goes through the llamaindex file readers
+        from llama_index.core import SimpleDirectoryReader
+        return SimpleDirectoryReader(input_files=[path], filename_as_id=True).load_data()
+
+    def _skip(self, path: str, reason: str):
+        print(f"SourceLoader: skipping {path}: {reason}")
+        self.skipped.append(path)
+        metrics.count("load_skipped_files")
+
+    # yields one list of documents per file, in completion order
+    def iter_data(self):
+        pdfs = deque(p for p in self.input_files if self.data_types.get(p) == "pdf")
+        others = deque(p for p in self.input_files if self.data_types.get(p) != "pdf")
+        running: dict = {}
+        try:
+            while len(pdfs) > 0 or len(others) > 0 or len(running) > 0:
+                # keep at most one extraction per worker in flight, so that the
+                # submit time is also the time the extraction started
+                while len(pdfs) > 0 and len(running) < self.pdf_workers:
+                    path = pdfs.popleft()
+                    running[self._executor().submit(extract_pdf_pages, path)] = (path, perf_counter())
+
+                if len(others) > 0:
+                    path = others.popleft()
+                    try:
+                        yield self._load(path)
+                    except Exception as e:
+                        self._skip(path, repr(e))
+                    poll = 0
+                else:
+                    poll = min(1.0, self.pdf_timeout)
+
+                done, _ = wait(list(running.keys()), timeout=poll, return_when=FIRST_COMPLETED) if len(running) > 0 else (set(), None)
+                for future in done:
+                    path, _ = running.pop(future)
+                    try:
+                        yield pdfDocuments(path, future.result())
+                    except Exception as e:
+                        self._skip(path, repr(e))
+
+                now = perf_counter()
+                expired = [f for f, (path, started) in running.items() if not f.done() and now - started > self.pdf_timeout]
+                if len(expired) > 0:
+                    for future in expired:
+                        self._skip(running.pop(future)[0], f"extraction timed out after {self.pdf_timeout}s")
+                    # the surviving extractions are restarted on a fresh pool
+                    pdfs.extendleft(path for path, _ in running.values())
+                    running.clear()
+                    self._kill_pool()
+        finally:
+            self._kill_pool()
+
+    def load_data(self) -> list:
+        return [doc for documents in self.iter_data() for doc in documents]
+
+    def __str__(self) -> str:
+        return f"SourceLoader: {len(self.input_files)} files - PDF workers: {self.pdf_workers} - PDF timeout: {self.pdf_timeout}s"
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+
+# corpus statistics workers. this module only depends on nltk, imported on
+# first use, so that spawned tokenizer processes start quickly
+import os
+import threading
+from hashlib import sha256
+from multiprocessing import get_context
+from concurrent.futures import ProcessPoolExecutor
+
+# below this many documents the pool startup costs more than it saves
+MIN_PARALLEL: int = 8
+
+_pool: ProcessPoolExecutor = None
+_pool_workers: int = 0
+_pool_lock = threading.Lock()
+_nltk_found: bool = False
+
+
+# tokenizer data is looked up locally, never downloaded implicitly
+def nltk_data_available() -> bool:
+    global _nltk_found
+    if not _nltk_found:
+        from nltk.data import find
+        try:
+            find("tokenizers/punkt_tab")
+            _nltk_found = True
+        except LookupError:
+            pass
+    return _nltk_found
+
+
+# per-document statistics: only counts are returned, never the token
+# lists or the vocabulary itself
+def document_stats(text: str) -> dict:
+    from nltk import word_tokenize, sent_tokenize
+    tokens = word_tokenize(text)
+    vocabulary = len(set(tokens))
+    return {"wordcount": len(tokens),
+            "sentence_count": len(sent_tokenize(text)),
+            "vocabulary": vocabulary,
+            "lexical_richness": (vocabulary / len(tokens)) if len(tokens) > 0 else 0.0}
+
+
+# deterministic sample membership, the same documents are sampled on every run
+def sampled(key: str, rate: float) -> bool:
+    if rate >= 1.0:
+        return True
+    return int(sha256(key.encode("utf-8")).hexdigest()[:8], 16) < rate * 0x100000000
+
+
+# shared tokenizer pool, spawned once and reused by every window. spawn keeps it
+# safe to use from the threads of the pipelined mode
+def _executor(workers: int) -> ProcessPoolExecutor:
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"))
+            _pool_workers = workers
+        return _pool
+
+
+# compute document_stats for every text, in a process pool with chunked
+# dispatch when workers != 1 (0 uses one process per cpu core)
+def corpus_stats(texts: list, workers: int = 1) -> list:
+    workers = workers if workers > 0 else (os.cpu_count() or 1)
+    if workers == 1 or len(texts) < MIN_PARALLEL:
+        return [document_stats(t) for t in texts]
+
+    chunksize = max(1, len(texts) // (workers * 4))
+    return list(_executor(workers).map(document_stats, texts, chunksize=chunksize))
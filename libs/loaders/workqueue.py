@@ -0,0 +1,241 @@
+#!/usr/bin/env python
+
+import os
+import sqlite3
+import threading
+from time import time
+from hashlib import sha256
+
+
+# stable shard of a file, identical on every worker and every machine
+def shard_of(path: str, shards: int) -> int:
+    return int(sha256(str(path).encode("utf-8")).hexdigest()[:8], 16) % max(shards, 1)
+
+
+# static partitioning: worker `index` of `shards` only ingests the files that hash to it
+class ShardFilter(object):
+    def __init__(self, index: int = 0, shards: int = 1):
+        if not 0 <= index < shards:
+            raise ValueError(f"ShardFilter: shard index must be in [0, {shards}), got {index}")
+        self.index: int = index
+        self.shards: int = shards
+
+    def owns(self, path: str) -> bool:
+        return shard_of(path, self.shards) == self.index
+
+    def select(self, paths: list) -> list:
+        return [p for p in paths if self.owns(p)]
+
+    def __str__(self) -> str:
+        return f"ShardFilter: shard {self.index}/{self.shards}"
+
+
+# work queue shared by the ingestion workers of a collection, backed by sqlite
+# (on a shared filesystem when workers run on several machines). workers claim
+# batches of files from their home shard first and then steal from the other
+# shards; claims of a worker that stops heartbeating for `lease` seconds are
+# handed out again, so a dead or stuck worker never blocks the run. a file
+# claimed max_attempts times without completing is marked failed
+class WorkQueue(object):
+    def __init__(self, path: str = "./ingest.queue.sqlite", scope: str = "default",
+                 shards: int = 1, lease: float = 600.0, max_attempts: int = 3):
+        self.path: str = path
+        self.scope: str = scope
+        self.shards: int = max(shards, 1)
+        self.lease: float = lease
+        self.max_attempts: int = max(max_attempts, 1)
+        self._heartbeat: threading.Thread = None
+        self._stop = threading.Event()
+
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+        # claims run on the pipeline source thread while commits run on the main thread
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(self.path, timeout=60, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""CREATE TABLE IF NOT EXISTS tasks (
+                                scope TEXT NOT NULL,
+                                path TEXT NOT NULL,
+                                shard INTEGER NOT NULL,
+                                version TEXT NOT NULL,
+                                state TEXT NOT NULL,
+                                worker TEXT,
+                                heartbeat REAL,
+                                attempts INTEGER NOT NULL DEFAULT 0,
+                                PRIMARY KEY (scope, path))""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS tasks_by_state ON tasks (scope, state, shard)")
+        self._db.execute("""CREATE TABLE IF NOT EXISTS workers (
+                                scope TEXT NOT NULL,
+                                worker TEXT NOT NULL,
+                                shard INTEGER,
+                                started REAL NOT NULL,
+                                heartbeat REAL NOT NULL,
+                                completed INTEGER NOT NULL DEFAULT 0,
+                                PRIMARY KEY (scope, worker))""")
+
+    # add files to the queue. files already done are queued again only when
+    # their size or mtime changed since they were ingested
+    def populate(self, paths: list) -> int:
+        with self._lock:
+            rows = []
+            for path in paths:
+                st = os.stat(path)
+                rows.append((self.scope, str(path), shard_of(path, self.shards), f"{st.st_size}:{st.st_mtime_ns}"))
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                before = self._db.total_changes
+                self._db.executemany("""INSERT INTO tasks (scope, path, shard, version, state) VALUES (?, ?, ?, ?, 'pending')
+                                        ON CONFLICT (scope, path) DO UPDATE SET version = excluded.version,
+                                            state = 'pending', worker = NULL, heartbeat = NULL, attempts = 0
+                                        WHERE tasks.version != excluded.version""", rows)
+                queued = self._db.total_changes - before
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+            return queued
+
+    # queue files again even though they did not change on disk
+    def requeue(self, paths: list) -> int:
+        with self._lock:
+            before = self._db.total_changes
+            self._db.executemany("""UPDATE tasks SET state = 'pending', worker = NULL, heartbeat = NULL, attempts = 0
+                                    WHERE scope = ? AND path = ? AND state != 'claimed'""",
+                                 [(self.scope, str(p)) for p in paths])
+            return self._db.total_changes - before
+
+    def register(self, worker: str, shard: int = None) -> None:
+        with self._lock:
+            now = time()
+            self._db.execute("""INSERT INTO workers (scope, worker, shard, started, heartbeat) VALUES (?, ?, ?, ?, ?)
+                                ON CONFLICT (scope, worker) DO UPDATE SET shard = excluded.shard, heartbeat = excluded.heartbeat""",
+                             (self.scope, worker, shard, now, now))
+
+    def heartbeat(self, worker: str) -> None:
+        with self._lock:
+            now = time()
+            self._db.execute("UPDATE workers SET heartbeat = ? WHERE scope = ? AND worker = ?", (now, self.scope, worker))
+            self._db.execute("UPDATE tasks SET heartbeat = ? WHERE scope = ? AND worker = ? AND state = 'claimed'",
+                             (now, self.scope, worker))
+
+    # keep the claims of a worker alive from a background thread, lease/3 apart,
+    # for as long as it holds them (a single large file can outlast the lease)
+    def start_heartbeat(self, worker: str, interval: float = None) -> None:
+        if self._heartbeat is not None:
+            return
+        interval = self.lease / 3 if interval is None else interval
+        self._stop.clear()
+
+        def beat():
+            while not self._stop.wait(interval):
+                try:
+                    self.heartbeat(worker)
+                except Exception as e:
+                    print(f"WorkQueue: heartbeat of {worker} failed: {e}")
+
+        self._heartbeat = threading.Thread(target=beat, name=f"heartbeat-{worker}", daemon=True)
+        self._heartbeat.start()
+
+    def stop_heartbeat(self) -> None:
+        if self._heartbeat is not None:
+            self._stop.set()
+            self._heartbeat.join()
+            self._heartbeat = None
+
+    # atomically claim up to `limit` pending files, home shard first. expired
+    # claims that already used their max_attempts are marked failed instead
+    def claim(self, worker: str, limit: int = 16, shard: int = None) -> list:
+        with self._lock:
+            now = time()
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute("""UPDATE tasks SET state = 'failed', worker = NULL, heartbeat = NULL
+                                    WHERE scope = ? AND state = 'claimed' AND heartbeat < ? AND attempts >= ?""",
+                                 (self.scope, now - self.lease, self.max_attempts))
+                rows = self._db.execute("""SELECT path FROM tasks
+                                           WHERE scope = ? AND (state = 'pending' OR (state = 'claimed' AND heartbeat < ?))
+                                           ORDER BY (shard = ?) DESC, shard, path LIMIT ?""",
+                                        (self.scope, now - self.lease, -1 if shard is None else shard, limit)).fetchall()
+                paths = [r[0] for r in rows]
+                self._db.executemany("""UPDATE tasks SET state = 'claimed', worker = ?, heartbeat = ?, attempts = attempts + 1
+                                        WHERE scope = ? AND path = ?""", [(worker, now, self.scope, p) for p in paths])
+                self._db.execute("UPDATE workers SET heartbeat = ? WHERE scope = ? AND worker = ?", (now, self.scope, worker))
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+            return paths
+
+    # claim batches until the queue is drained
+    def claims(self, worker: str, limit: int = 16, shard: int = None):
+        while True:
+            paths = self.claim(worker, limit=limit, shard=shard)
+            if len(paths) == 0:
+                return
+            yield paths
+
+    def complete(self, worker: str, paths: list) -> None:
+        with self._lock:
+            self._db.executemany("UPDATE tasks SET state = 'done', heartbeat = ? WHERE scope = ? AND path = ?",
+                                 [(time(), self.scope, str(p)) for p in paths])
+            self._db.execute("UPDATE workers SET completed = completed + ? WHERE scope = ? AND worker = ?",
+                             (len(paths), self.scope, worker))
+            self.heartbeat(worker)
+
+    # hand the claims of workers silent for more than `lease` seconds (or of the
+    # given workers) back to the queue, returns the number of released files.
+    # files out of attempts are marked failed rather than released
+    def rebalance(self, lease: float = None, workers: list = None) -> int:
+        released = """UPDATE tasks SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+                                          worker = NULL, heartbeat = NULL"""
+        with self._lock:
+            before = self._db.total_changes
+            if workers:
+                self._db.executemany(f"{released} WHERE scope = ? AND state = 'claimed' AND worker = ?",
+                                     [(self.max_attempts, self.scope, w) for w in workers])
+            else:
+                self._db.execute(f"{released} WHERE scope = ? AND state = 'claimed' AND heartbeat < ?",
+                                 (self.max_attempts, self.scope, time() - (self.lease if lease is None else lease)))
+            return self._db.total_changes - before
+
+    # queue the failed files again with a fresh set of attempts
+    def retry_failed(self) -> int:
+        with self._lock:
+            before = self._db.total_changes
+            self._db.execute("UPDATE tasks SET state = 'pending', attempts = 0 WHERE scope = ? AND state = 'failed'", (self.scope,))
+            return self._db.total_changes - before
+
+    def failed(self) -> list:
+        with self._lock:
+            rows = self._db.execute("SELECT path FROM tasks WHERE scope = ? AND state = 'failed' ORDER BY path", (self.scope,))
+            return [r[0] for r in rows]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM tasks WHERE scope = ?", (self.scope,))
+            self._db.execute("DELETE FROM workers WHERE scope = ?", (self.scope,))
+
+    # per-shard task counts by state
+    def progress(self) -> dict:
+        with self._lock:
+            shards: dict = {}
+            rows = self._db.execute("SELECT shard, state, COUNT(*) FROM tasks WHERE scope = ? GROUP BY shard, state", (self.scope,))
+            for shard, state, count in rows:
+                shards.setdefault(shard, {"pending": 0, "claimed": 0, "done": 0, "failed": 0})[state] = count
+            return shards
+
+    def workers(self) -> list:
+        with self._lock:
+            rows = self._db.execute("""SELECT w.worker, w.shard, w.started, w.heartbeat, w.completed,
+                                              (SELECT COUNT(*) FROM tasks t WHERE t.scope = w.scope AND t.worker = w.worker AND t.state = 'claimed')
+                                       FROM workers w WHERE w.scope = ? ORDER BY w.worker""", (self.scope,))
+            return [{"worker": worker, "shard": shard, "started": started, "heartbeat": heartbeat,
+                     "completed": completed, "claimed": claimed} for worker, shard, started, heartbeat, completed, claimed in rows]
+
+    def close(self) -> None:
+        self.stop_heartbeat()
+        self._db.close()
+
+    def __str__(self) -> str:
+        return f"WorkQueue: {self.path} - Scope: {self.scope} - {self.shards} shards - {self.max_attempts} attempts"
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+try:
+    import os
+    import re
+    from bisect import bisect_left
+    from functools import lru_cache
+    from typing import Any, List, Sequence
+    import llama_index.core
+    from llama_index.core.bridge.pydantic import Field
+    from llama_index.core.ingestion import IngestionPipeline
+    from llama_index.core.node_parser import NodeParser
+    from llama_index.core.node_parser.node_utils import build_nodes_from_splits
+    from llama_index.core.schema import BaseNode
+except Exception as e:
+    print(f"Caught Exception {e}")
+
+SPLITTER_MODES = ("token", "character")
+
+_WHITESPACE = re.compile(r"\s")
+
+# tiktoken looks up its bpe files in the cache bundled with llama_index, so that
+# encodings are never downloaded at runtime. set once, a configured
+# TIKTOKEN_CACHE_DIR is left untouched
+os.environ.setdefault("TIKTOKEN_CACHE_DIR", os.path.join(os.path.dirname(llama_index.core.__file__), "_static", "tiktoken_cache"))
+
+
+@lru_cache(maxsize=None)
+def _encoding(name: str):
+    import tiktoken
+    return tiktoken.get_encoding(name)
+
+
+# fixed size splitter: chunks of at most chunk_size tokens (or characters), of which
+# the first chunk_overlap are shared with the previous chunk. a chunk ends after the
+# last separator in the second half of its window, else after the last space, else
+# it is cut at the size limit. no embedding model is involved
+class FixedSizeNodeParser(NodeParser):
+    mode: str = Field(default="token", description="Unit of chunk_size and chunk_overlap: token or character")
+    chunk_size: int = Field(default=1000, gt=0, description="Maximum chunk length in units")
+    chunk_overlap: int = Field(default=0, ge=0, description="Units shared between consecutive chunks")
+    separator: str = Field(default="\n\n", description="Preferred chunk boundary")
+    encoding: str = Field(default="cl100k_base", description="tiktoken encoding used in token mode")
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "FixedSizeNodeParser"
+
+    # character offset of every unit of text, plus len(text) as the end sentinel
+    def _offsets(self, text: str) -> List[int]:
+        if self.mode == "character":
+            return range(len(text) + 1)
+        encoding = _encoding(self.encoding)
+        _, offsets = encoding.decode_with_offsets(encoding.encode_ordinary(text))
+        return offsets + [len(text)]
+
+    def _window_end(self, text: str, offsets: Sequence[int], start: int, end: int) -> int:
+        lower, upper = offsets[start], offsets[end]
+        for boundary in (self.separator, " "):
+            if len(boundary) == 0:
+                continue
+            cut = text.rfind(boundary, lower + (upper - lower) // 2, upper)
+            if cut >= 0:
+                # first unit at or after the boundary
+                snapped = bisect_left(offsets, cut + len(boundary), start + 1, end)
+                if start < snapped <= end:
+                    return snapped
+        return end
+
+    # (start, end) character spans of the chunks of text
+    def split_spans(self, text: str) -> List[tuple]:
+        offsets = self._offsets(text)
+        units = len(offsets) - 1
+        overlap = min(self.chunk_overlap, self.chunk_size - 1)
+        spans = []
+        start = 0
+        while start < units:
+            end = min(start + self.chunk_size, units)
+            if end < units:
+                end = self._window_end(text, offsets, start, end)
+            spans.append((offsets[start], offsets[end]))
+            if end >= units:
+                break
+            next_start = max(end - overlap, start + 1)
+            if next_start < end:
+                # overlapping chunks start on a word boundary
+                space = _WHITESPACE.search(text, offsets[next_start], offsets[end])
+                if space is not None:
+                    next_start = bisect_left(offsets, space.end(), next_start, end)
+            start = next_start
+        return spans
+
+    def split_text(self, text: str) -> List[str]:
+        chunks = (text[lower:upper].strip() for lower, upper in self.split_spans(text))
+        return [c for c in chunks if len(c) > 0]
+
+    def _parse_nodes(self, nodes: Sequence[BaseNode], show_progress: bool = False, **kwargs: Any) -> List[BaseNode]:
+        if self.mode not in SPLITTER_MODES:
+            raise ValueError(f"FixedSizeNodeParser: unknown mode {self.mode}, expected one of {', '.join(SPLITTER_MODES)}")
+
+        all_nodes: List[BaseNode] = []
+        for node in nodes:
+            chunks = self.split_text(node.get_content())
+            all_nodes.extend(build_nodes_from_splits(chunks, node, id_func=self.id_func))
+        return all_nodes
+
+
+def fixedSplitterPipeline(documents: list,
+                          mode: str = "token",
+                          chunk_size: int = 1000,
+                          chunk_overlap: int = 0,
+                          separator: str = "\n\n",
+                          encoding: str = "cl100k_base") -> IngestionPipeline:
+    ip: IngestionPipeline = IngestionPipeline(
+            transformations=[
+                    FixedSizeNodeParser(mode=mode,
+                                        chunk_size=chunk_size,
+                                        chunk_overlap=chunk_overlap,
+                                        separator=separator,
+                                        encoding=encoding),
+                ],
+            )
+
+    return ip
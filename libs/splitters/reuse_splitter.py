@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+try:
+    from typing import Any, Callable, List, Sequence
+    import numpy as np
+    from llama_index.core.base.embeddings.base import BaseEmbedding
+    from llama_index.core.bridge.pydantic import Field, SerializeAsAny
+    from llama_index.core.ingestion import IngestionPipeline
+    from llama_index.core.node_parser import NodeParser
+    from llama_index.core.node_parser.node_utils import build_nodes_from_splits
+    from llama_index.core.node_parser.text.utils import split_by_sentence_tokenizer
+    from llama_index.core.node_parser.text.semantic_splitter import SentenceSplitterCallable
+    from llama_index.core.schema import BaseNode
+    from libs.utils.metrics import metrics
+except Exception as e:
+    print(f"Caught Exception {e}")
+
+EMBEDDING_MODES = ("pooled", "threshold", "none")
+
+
+# semantic splitter that keeps the sentence group embeddings computed to find
+# breakpoints and can reuse them for the resulting chunks:
+#   none:      vectors are discarded, every chunk is re-embedded (exact, the default)
+#   pooled:    every chunk gets the mean of its sentence group vectors, no chunk is
+#              embedded again but the vectors only approximate the chunk embeddings,
+#              which costs retrieval quality
+#   threshold: chunks up to reembed_threshold characters get the pooled vector,
+#              longer ones are left without embedding and get re-embedded by the writer
+class EmbeddingReuseSplitterNodeParser(NodeParser):
+    embed_model: SerializeAsAny[BaseEmbedding] = Field(description="The embedding model used for semantic comparison")
+    sentence_splitter: SentenceSplitterCallable = Field(default_factory=split_by_sentence_tokenizer, exclude=True)
+    buffer_size: int = Field(default=1, description="Number of neighbouring sentences grouped with each sentence")
+    breakpoint_percentile_threshold: int = Field(default=95, description="Percentile of cosine distance that opens a new chunk")
+    embedding_mode: str = Field(default="none", description="One of none, pooled or threshold")
+    reembed_threshold: int = Field(default=1000, description="Chunks longer than this (characters) are re-embedded in threshold mode")
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "EmbeddingReuseSplitterNodeParser"
+
+    def _sentence_groups(self, sentences: List[str]) -> List[str]:
+        groups = []
+        for i in range(len(sentences)):
+            lower, upper = max(i - self.buffer_size, 0), min(i + 1 + self.buffer_size, len(sentences))
+            groups.append("".join(sentences[lower:upper]))
+        return groups
+
+    # one vectorized cosine distance pass, returns the chunk boundaries as (start, end) sentence ranges
+    def _breakpoints(self, vectors: np.ndarray) -> List[tuple]:
+        if len(vectors) < 2:
+            return [(0, len(vectors))]
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        unit = vectors / np.maximum(norms, 1e-12)
+        distances = 1.0 - np.einsum("ij,ij->i", unit[:-1], unit[1:])
+        threshold = np.percentile(distances, self.breakpoint_percentile_threshold)
+        ends = (np.flatnonzero(distances > threshold) + 1).tolist() + [len(vectors)]
+        starts = [0] + ends[:-1]
+        return list(zip(starts, ends))
+
+    def _keep_pooled(self, text: str) -> bool:
+        if self.embedding_mode == "pooled":
+            return True
+        elif self.embedding_mode == "threshold":
+            return len(text) <= self.reembed_threshold
+        return False
+
+    def _parse_nodes(self, nodes: Sequence[BaseNode], show_progress: bool = False, **kwargs: Any) -> List[BaseNode]:
+        if self.embedding_mode not in EMBEDDING_MODES:
+            raise ValueError(f"EmbeddingReuseSplitterNodeParser: unknown embedding_mode {self.embedding_mode}")
+
+        # embed the sentence groups of all documents in a single batched call
+        documents = [(node, self.sentence_splitter(node.get_content())) for node in nodes]
+        groups = [self._sentence_groups(sentences) for _, sentences in documents]
+        flat_groups = [g for doc_groups in groups for g in doc_groups]
+        vectors = np.asarray(self.embed_model.get_text_embedding_batch(flat_groups, show_progress=show_progress),
+                             dtype=np.float32)
+
+        all_nodes: List[BaseNode] = []
+        offset, reused = 0, 0
+        for (document, sentences), doc_groups in zip(documents, groups):
+            doc_vectors = vectors[offset:offset+len(doc_groups)]
+            offset += len(doc_groups)
+            if len(sentences) == 0:
+                continue
+
+            ranges = self._breakpoints(doc_vectors)
+            chunks = ["".join(sentences[start:end]) for start, end in ranges]
+            doc_nodes = build_nodes_from_splits(chunks, document, id_func=self.id_func)
+            for node, (start, end) in zip(doc_nodes, ranges):
+                if self._keep_pooled(node.text):
+                    node.embedding = doc_vectors[start:end].mean(axis=0).tolist()
+                    reused += 1
+            all_nodes.extend(doc_nodes)
+        # chunks that will not be sent to the embedding model
+        metrics.count("reused_embeddings", reused)
+        return all_nodes
+
+
+def reuseSplitterPipeline(documents: list,
+                          embedder: Callable,
+                          embedding_mode: str = "none",
+                          reembed_threshold: int = 1000) -> IngestionPipeline:
+    ip: IngestionPipeline = IngestionPipeline(
+            transformations=[
+                    EmbeddingReuseSplitterNodeParser(embed_model=embedder,
+                                                     embedding_mode=embedding_mode,
+                                                     reembed_threshold=reembed_threshold),
+                ],
+            )
+
+    return ip
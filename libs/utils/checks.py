@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+
+# preflight checks for main.py --check: configuration, connectivity and local
+# data, without importing the ingestion stack or loading embedding models
+import os
+import json
+from urllib.request import Request, urlopen
+
+
+def check_writable(path: str) -> tuple:
+    directory = os.path.dirname(os.path.abspath(path)) if not os.path.isdir(path) else path
+    while not os.path.exists(directory):
+        directory = os.path.dirname(directory)
+    if os.access(directory, os.W_OK):
+        return True, f"{path} is writable"
+    return False, f"{path} is not writable ({directory})"
+
+
+def check_http(url: str, headers: dict = {}, timeout: float = 5.0) -> tuple:
+    try:
+        with urlopen(Request(url, headers=headers), timeout=timeout) as response:
+            return True, f"{url} answered {response.status}"
+    except Exception as e:
+        return False, f"{url} is not reachable: {e}"
+
+
+def check_chroma(host: str, port: int, timeout: float = 5.0) -> tuple:
+    ok, message = check_http(f"http://{host}:{port}/api/v2/heartbeat", timeout=timeout)
+    if not ok:
+        # servers older than the v2 api
+        ok, message = check_http(f"http://{host}:{port}/api/v1/heartbeat", timeout=timeout)
+    return ok, f"chromadb: {message}"
+
+
+def check_ollama(base_url: str, model: str, timeout: float = 5.0) -> tuple:
+    url = f"{base_url.rstrip('/')}/api/tags"
+    try:
+        with urlopen(url, timeout=timeout) as response:
+            models = [m.get("name") for m in json.load(response).get("models", [])]
+    except Exception as e:
+        return False, f"ollama: {url} is not reachable: {e}"
+    if model not in models and f"{model}:latest" not in models:
+        return False, f"ollama: model {model} is not pulled on {base_url}"
+    return True, f"ollama: {base_url} serves {model}"
+
+
+def check_openai(base_url: str, api_key: str = None, timeout: float = 5.0) -> tuple:
+    headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+    ok, message = check_http(f"{base_url.rstrip('/')}/models", headers=headers, timeout=timeout)
+    return ok, f"openai: {message}"
+
+
+# looks the model up in the huggingface cache without importing sentence-transformers
+def check_sentence_transformer(model: str) -> tuple:
+    if os.path.isdir(model):
+        return True, f"sentence transformer: local model directory {model}"
+    repository = model if "/" in model else f"sentence-transformers/{model}"
+    try:
+        from huggingface_hub import try_to_load_from_cache
+        cached = try_to_load_from_cache(repository, "config.json")
+    except Exception:
+        cached = None
+    if isinstance(cached, str):
+        return True, f"sentence transformer: {repository} is cached"
+    return False, f"sentence transformer: {repository} is not cached, it will be downloaded on first use"
+
+
+def check_nltk() -> tuple:
+    from libs.loaders.textstats import nltk_data_available
+    if nltk_data_available():
+        return True, "nltk: punkt_tab tokenizer data found"
+    return False, "nltk: punkt_tab tokenizer data not found, corpus statistics are skipped (python -m nltk.downloader punkt_tab)"
@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+
+import os
+import re
+import json
+import cProfile
+import threading
+from time import perf_counter, time
+from contextlib import contextmanager
+
+# latency histogram buckets, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, float("inf"))
+
+
+class _NoopTimer(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _NoopTimer()
+
+
+class _Timer(object):
+    def __init__(self, registry, name: str):
+        self._registry = registry
+        self._name = name
+
+    def __enter__(self):
+        self._started = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._registry.record_time(self._name, perf_counter() - self._started)
+        return False
+
+
+# per-stage metrics registry: stage timings, counters and latency histograms.
+# every entry point returns immediately when the registry is disabled, so the
+# instrumentation can stay in the hot paths at negligible cost
+class Metrics(object):
+    def __init__(self, enabled: bool = False):
+        self.enabled: bool = enabled
+        self.profile_dir: str = None
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._stages: dict = {}
+            self._counters: dict = {}
+            self._histograms: dict = {}
+
+    def timer(self, stage: str):
+        if not self.enabled:
+            return _NOOP
+        return _Timer(self, stage)
+
+    def record_time(self, stage: str, seconds: float):
+        if not self.enabled:
+            return
+        with self._lock:
+            calls, total = self._stages.get(stage, (0, 0.0))
+            self._stages[stage] = (calls + 1, total + seconds)
+
+    def count(self, name: str, value: float = 1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def observe(self, name: str, value: float):
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = {"buckets": [0] * len(BUCKETS), "sum": 0.0, "count": 0}
+            for k, bound in enumerate(BUCKETS):
+                if value <= bound:
+                    histogram["buckets"][k] += 1
+                    break
+            histogram["sum"] += value
+            histogram["count"] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            stages = {name: {"calls": calls, "seconds": total} for name, (calls, total) in self._stages.items()}
+            histograms = {name: {"buckets": dict(zip([str(b) for b in BUCKETS], h["buckets"])),
+                                 "sum": h["sum"], "count": h["count"]} for name, h in self._histograms.items()}
+            counters = dict(self._counters)
+
+        # derived ratios
+        lookups = counters.get("cache_hits", 0) + counters.get("cache_misses", 0)
+        if lookups > 0:
+            counters["cache_hit_rate"] = counters.get("cache_hits", 0) / lookups
+        return {"timestamp": time(), "stages": stages, "counters": counters, "histograms": histograms}
+
+    # append one json line per export
+    def write_jsonl(self, path: str, **labels):
+        record = self.snapshot()
+        record["labels"] = labels
+        with open(path, "a") as f:
+            f.write(json.dumps(record) + "\n")
+
+    # prometheus textfile collector format, written atomically
+    def write_prometheus(self, path: str, prefix: str = "chroma_ingestor", **labels):
+        def name(*parts) -> str:
+            return re.sub(r"[^a-zA-Z0-9_]", "_", "_".join((prefix,) + parts))
+
+        def label_set(extra: dict = {}) -> str:
+            merged = {**labels, **extra}
+            if len(merged) == 0:
+                return ""
+            return "{" + ",".join(f'{k}="{v}"' for k, v in sorted(merged.items())) + "}"
+
+        snapshot = self.snapshot()
+        lines = [f"# TYPE {name('stage_seconds_total')} counter",
+                 f"# TYPE {name('stage_calls_total')} counter"]
+        for stage, values in sorted(snapshot["stages"].items()):
+            lines.append(f"{name('stage_seconds_total')}{label_set({'stage': stage})} {values['seconds']}")
+            lines.append(f"{name('stage_calls_total')}{label_set({'stage': stage})} {values['calls']}")
+        for counter, value in sorted(snapshot["counters"].items()):
+            metric = name(counter) if counter.endswith("_rate") else name(counter, "total")
+            lines.append(f"# TYPE {metric} {'gauge' if counter.endswith('_rate') else 'counter'}")
+            lines.append(f"{metric}{label_set()} {value}")
+        for histogram, values in sorted(snapshot["histograms"].items()):
+            metric = name(histogram)
+            lines.append(f"# TYPE {metric} histogram")
+            cumulative = 0
+            for bound, bucket in values["buckets"].items():
+                cumulative += bucket
+                le = "+Inf" if bound == "inf" else bound
+                lines.append(f"{metric}_bucket{label_set({'le': le})} {cumulative}")
+            lines.append(f"{metric}_sum{label_set()} {values['sum']}")
+            lines.append(f"{metric}_count{label_set()} {values['count']}")
+
+        temporary = f"{path}.tmp"
+        with open(temporary, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(temporary, path)
+
+
+# process wide registry, disabled until configured
+metrics = Metrics()
+
+
+def configure(enabled: bool = False, profile_dir: str = None) -> Metrics:
+    metrics.enabled = enabled
+    metrics.profile_dir = profile_dir
+    if profile_dir:
+        os.makedirs(profile_dir, exist_ok=True)
+    return metrics
+
+
+# cProfile the calling thread when profiling is configured, dumping to <profile_dir>/<name>.prof
+# worker threads are named after their pipeline stage, which also keeps py-spy dumps readable
+@contextmanager
+def profiled(name: str):
+    directory = metrics.profile_dir
+    if not directory:
+        yield
+        return
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # python >= 3.12 allows a single active profiler, which then covers every thread
+        yield
+        return
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(os.path.join(directory, f"{re.sub(r'[^a-zA-Z0-9_.-]', '_', name)}.prof"))
@@ -12,3 +12,7 @@ class Parameters(object):
                 self.__setattr__(k, self.data.get(k))
             else:
                 self.__setattr__(k, Parameters(self.data.get(k)))
+
+    # optional configuration keys, returns default when the key is not set
+    def get(self, key: str, default=None):
+        return getattr(self, key, default)
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+
+import threading
+from queue import Queue, Empty
+from typing import Callable, Iterable
+from libs.utils.metrics import profiled
+
+# end of stream marker passed between stages
+_DONE = object()
+
+
+# a pipeline stage: func is applied to every item by `workers` threads,
+# results are pushed to a bounded queue feeding the next stage.
+# stage timings are not kept here: the stage functions report them to the metrics registry
+class Stage(object):
+    def __init__(self, name: str, func: Callable, workers: int = 1, queue_size: int = 4):
+        self.name: str = name
+        self.func: Callable = func
+        self.workers: int = max(workers, 1)
+        self.queue_size: int = max(queue_size, 1)
+        self._lock = threading.Lock()
+
+
+# producer/consumer pipeline with bounded queues between stages
+# a full queue blocks the upstream stage (backpressure), so memory stays
+# bounded by queue_size items per stage and every stage runs concurrently
+class Pipeline(object):
+    def __init__(self, stages: list):
+        if len(stages) == 0:
+            raise ValueError("Pipeline: at least one stage is required")
+        self.stages: list = stages
+        self._error: Exception = None
+        self._stop = threading.Event()
+
+    def _put(self, queue: Queue, item) -> bool:
+        # retry so that a failure downstream never leaves a producer blocked forever
+        while not self._stop.is_set():
+            try:
+                queue.put(item, timeout=0.1)
+                return True
+            except Exception:
+                continue
+        return False
+
+    def _get(self, queue: Queue):
+        while not self._stop.is_set():
+            try:
+                return queue.get(timeout=0.1)
+            except Empty:
+                continue
+        return _DONE
+
+    def _fail(self, e: Exception):
+        if self._error is None:
+            self._error = e
+        self._stop.set()
+
+    def _source(self, source: Iterable, output: Queue, consumers: int):
+        try:
+            for item in source:
+                if not self._put(output, item):
+                    return
+        except Exception as e:
+            self._fail(e)
+        finally:
+            for _ in range(consumers):
+                self._put(output, _DONE)
+
+    def _worker(self, stage: Stage, input: Queue, output: Queue, remaining: list, consumers: int):
+        try:
+            with profiled(threading.current_thread().name):
+                self._consume(stage, input, output)
+        except Exception as e:
+            self._fail(e)
+        finally:
+            # the last worker of a stage propagates the end of stream downstream
+            with stage._lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            if last:
+                for _ in range(consumers):
+                    self._put(output, _DONE)
+
+    def _consume(self, stage: Stage, input: Queue, output: Queue):
+        while True:
+            item = self._get(input)
+            if item is _DONE:
+                break
+            result = stage.func(item)
+            if result is not None and not self._put(output, result):
+                break
+
+    # run the pipeline over source, yielding the output of the last stage
+    def run(self, source: Iterable):
+        queues = [Queue(maxsize=stage.queue_size) for stage in self.stages]
+        queues.append(Queue(maxsize=self.stages[-1].queue_size))
+        threads = [threading.Thread(target=self._source, args=(source, queues[0], self.stages[0].workers),
+                                    name="pipeline-source", daemon=True)]
+        for k, stage in enumerate(self.stages):
+            consumers = self.stages[k+1].workers if k + 1 < len(self.stages) else 1
+            remaining = [stage.workers]
+            for n in range(stage.workers):
+                threads.append(threading.Thread(target=self._worker,
+                                                args=(stage, queues[k], queues[k+1], remaining, consumers),
+                                                name=f"pipeline-{stage.name}-{n}", daemon=True))
+        for t in threads:
+            t.start()
+
+        try:
+            while True:
+                item = self._get(queues[-1])
+                if item is _DONE:
+                    break
+                yield item
+        finally:
+            self._stop.set()
+            for t in threads:
+                t.join()
+
+        if self._error is not None:
+            raise self._error
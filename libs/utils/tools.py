@@ -4,17 +4,36 @@ from numpy import cumsum
 
 def splitList(inputlist: list, batch_num: int = 1) -> list:
     items: int = len(inputlist)
-    step: int = items//batch_num
+    if items == 0:
+        return []
+
+    # ceil division, so that at most batch_num batches are produced
+    batch_num = min(max(batch_num, 1), items)
+    step: int = -(-items // batch_num)
 
     # split array in batches
     batches: list = []
-    if (step > 0):
-        for k in range(0, items, step):
-            batches.append(inputlist[k:k+step])
+    for k in range(0, items, step):
+        batches.append(inputlist[k:k+step])
+
+    print(f"Generated {len(batches)} batches of size {step}")
+    print(cumsum([len(x) for x in batches]))
+    return batches
 
-        print(f"Generated {len(batches)} batches of size {step}")
-        print(cumsum([len(x) for x in batches]))
-        return batches
-    else:
-      print(f"Refusing to split: Cannot prepare batches of {step} length")
-      return inputlist
+
+# cut a list in consecutive batches bounded both by item count and by
+# the total size reported by sizeof for the items in the batch
+def sizedBatches(inputlist: list, max_items: int, max_bytes: int, sizeof) -> list:
+    batches: list = []
+    current: list = []
+    current_bytes: int = 0
+    for item in inputlist:
+        item_bytes = sizeof(item)
+        if len(current) > 0 and (len(current) >= max_items or current_bytes + item_bytes > max_bytes):
+            batches.append(current)
+            current, current_bytes = [], 0
+        current.append(item)
+        current_bytes += item_bytes
+    if len(current) > 0:
+        batches.append(current)
+    return batches
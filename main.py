@@ -5,18 +5,35 @@
 #
 # v0.1 - Very Basic initial implementation - mcaimi@redhat.com
 
+import os
 import argparse
 from sys import exit
 from yaml import safe_load, YAMLError
 from libs.utils.console_utils import ANSIColors
 from libs.utils.parameters import Parameters
 
+
+def export_metrics(metrics, metrics_parms, **labels):
+    if metrics_parms.get("jsonl"):
+        metrics.write_jsonl(metrics_parms.jsonl, **labels)
+    if metrics_parms.get("prometheus"):
+        metrics.write_prometheus(metrics_parms.prometheus, **labels)
+
+
 if __name__ == "__main__":
     ttyWriter = ANSIColors()
     parser = argparse.ArgumentParser(prog="ChromaDB Ingestor",
                                      description="Document ingestor for ChromaDB")
 
     parser.add_argument("-c", "--config_file", action="store", required=True)
+    parser.add_argument("-r", "--resume", action="store_true", default=False,
+                        help="resume an interrupted ingestion, skipping files already committed")
+    parser.add_argument("-s", "--shard", action="store", type=int, default=None,
+                        help="shard index of this worker, in [0, sharding.shards)")
+    parser.add_argument("-w", "--worker", action="store", default=None,
+                        help="worker name in queue mode (default: hostname-pid), name workers sharing a journal to --resume them")
+    parser.add_argument("--check", action="store_true", default=False,
+                        help="validate the configuration and connectivity without loading models, then exit")
     arguments = parser.parse_args()
 
     ttyWriter.print_success(text=f"Loading Configuration File {arguments.config_file}...")
@@ -34,25 +51,266 @@ if __name__ == "__main__":
 
     ttyWriter.print_success(text=f"Running ingestor in remote={parms.chromadb.remote} mode...")
 
+    # preflight: configuration, connectivity and local data only, no model is loaded
+    if arguments.check:
+        from libs.utils import checks
+        results = []
+        if parms.chromadb.remote:
+            results.append(checks.check_chroma(parms.chromadb.host, int(parms.chromadb.port)))
+        else:
+            results.append(checks.check_writable(parms.chromadb.persist_dir))
+        if parms.embeddings.local:
+            # a missing model is downloaded on first use, only a warning
+            ok, message = checks.check_sentence_transformer(parms.embeddings.sentence_transformer.model)
+            ttyWriter.print_success(message) if ok else ttyWriter.print_warning(message)
+        elif parms.embeddings.remote_service in ("ollama", "ollama_async"):
+            results.append(checks.check_ollama(parms.embeddings.ollama.baseurl, parms.embeddings.ollama.model))
+        elif parms.embeddings.remote_service in ("openai", "openai_async"):
+            results.append(checks.check_openai(parms.embeddings.openai.baseurl, parms.embeddings.openai.apikey))
+        else:
+            results.append((False, f"Unsupported Remote Service Type: {parms.embeddings.remote_service}"))
+        if parms.training_data.get("loader") is not None and parms.training_data.loader.enabled:
+            data_paths = [s.get("path") for s in parms.training_data.sources]
+        else:
+            data_paths = [parms.llamaindex.data_path]
+        for data_path in data_paths:
+            results.append((os.path.isdir(data_path), f"data path {data_path} {'exists' if os.path.isdir(data_path) else 'does not exist'}"))
+        for path in (parms.chromadb.get("manifest"), parms.training_data.get("journal"),
+                     parms.embeddings.cache.path if parms.embeddings.get("cache") is not None and parms.embeddings.cache.enabled else None,
+                     parms.sharding.queue if parms.get("sharding") is not None and parms.sharding.enabled else None):
+            if path:
+                results.append(checks.check_writable(path))
+        ok, message = checks.check_nltk()
+        ttyWriter.print_success(message) if ok else ttyWriter.print_warning(message)
+
+        for ok, message in results:
+            ttyWriter.print_success(message) if ok else ttyWriter.print_error(message)
+        exit(0 if all(ok for ok, _ in results) else 1)
+
+    # per-stage metrics and optional profiling
+    from libs.utils.metrics import configure as configure_metrics, profiled
+    metrics_parms = parms.get("metrics")
+    metrics_enabled = metrics_parms is not None and metrics_parms.enabled
+    metrics = configure_metrics(enabled=metrics_enabled,
+                                profile_dir=(metrics_parms.get("profile_dir") or None) if metrics_enabled else None)
+    if metrics_enabled:
+        ttyWriter.print_warning(f"Metrics enabled: jsonl={metrics_parms.get('jsonl')} prometheus={metrics_parms.get('prometheus')} profile_dir={metrics.profile_dir}")
+
+    # embedding models are imported and loaded on first use
     if parms.embeddings.local:
         ttyWriter.print_warning(f"Running Sentence Transformer embedding with model {parms.embeddings.sentence_transformer.model}")
-        from libs.embedding.sentencetransformer import s_transformer
-        embed_func = s_transformer(model=parms.embeddings.sentence_transformer.model)
+        st_parms = parms.embeddings.sentence_transformer
+        embed_model_name = st_parms.model
+        if int(st_parms.get("workers", 1)) != 1:
+            ttyWriter.print_warning(f"Sentence Transformer process pool: workers={st_parms.workers} batch_size={st_parms.get('batch_size', 32)}")
+
+            def embed_factory():
+                from libs.embedding.sentencetransformer import s_transformer_pool
+                return s_transformer_pool(model=st_parms.model,
+                                          batch_size=int(st_parms.get("batch_size", 32)),
+                                          workers=int(st_parms.workers))
+        else:
+            def embed_factory():
+                from libs.embedding.sentencetransformer import s_transformer
+                return s_transformer(model=st_parms.model)
     else:
         if parms.embeddings.remote_service == "ollama":
             ttyWriter.print_warning(f"Running Ollama embedding with model {parms.embeddings.ollama.model}")
             ttyWriter.print_warning(f"Ollama API URL: {parms.embeddings.ollama.baseurl}")
-            from libs.embedding.ollama import ollama_instance
-            embed_func = ollama_instance(base_url=parms.embeddings.ollama.baseurl, model=parms.embeddings.ollama.model)
+            embed_model_name = parms.embeddings.ollama.model
+
+            def embed_factory():
+                from libs.embedding.ollama import ollama_instance
+                return ollama_instance(base_url=parms.embeddings.ollama.baseurl, model=parms.embeddings.ollama.model)
         elif parms.embeddings.remote_service == "openai":
             ttyWriter.print_warning(f"Running OpenAI-Compatible embedding with model {parms.embeddings.openai.model}")
             ttyWriter.print_warning(f"OpenAI API URL: {parms.embeddings.openai.baseurl} - APIKEY: {parms.embeddings.openai.apikey}")
-            from libs.embedding.openai import openai_instance
-            embed_func = openai_instance(base_url=parms.embeddings.openai.baseurl, model=parms.embeddings.openai.model, api_key=parms.embeddings.openai.apikey)
+            embed_model_name = parms.embeddings.openai.model
+
+            def embed_factory():
+                from libs.embedding.openai import openai_instance
+                return openai_instance(base_url=parms.embeddings.openai.baseurl, model=parms.embeddings.openai.model, api_key=parms.embeddings.openai.apikey)
+        elif parms.embeddings.remote_service in ("ollama_async", "openai_async"):
+            async_parms = parms.embeddings.async_client
+            async_options = {"concurrency": int(async_parms.concurrency),
+                             "batch_size": int(async_parms.batch_size),
+                             "max_batch_size": int(async_parms.max_batch_size),
+                             "target_latency": float(async_parms.target_latency),
+                             "max_retries": int(async_parms.max_retries),
+                             "timeout": float(async_parms.timeout)}
+            if parms.embeddings.remote_service == "ollama_async":
+                ttyWriter.print_warning(f"Running async Ollama embedding with model {parms.embeddings.ollama.model} - concurrency {async_parms.concurrency}")
+                ttyWriter.print_warning(f"Ollama API URL: {parms.embeddings.ollama.baseurl}")
+                embed_model_name = parms.embeddings.ollama.model
+
+                def embed_factory():
+                    from libs.embedding.async_http import async_ollama_instance
+                    return async_ollama_instance(base_url=parms.embeddings.ollama.baseurl, model=parms.embeddings.ollama.model, **async_options)
+            else:
+                ttyWriter.print_warning(f"Running async OpenAI-Compatible embedding with model {parms.embeddings.openai.model} - concurrency {async_parms.concurrency}")
+                ttyWriter.print_warning(f"OpenAI API URL: {parms.embeddings.openai.baseurl} - APIKEY: {parms.embeddings.openai.apikey}")
+                embed_model_name = parms.embeddings.openai.model
+
+                def embed_factory():
+                    from libs.embedding.async_http import async_openai_instance
+                    return async_openai_instance(base_url=parms.embeddings.openai.baseurl, model=parms.embeddings.openai.model, api_key=parms.embeddings.openai.apikey, **async_options)
         else:
             ttyWriter.print_error(f"Unsupported Remote Service Type: {parms.embeddings.remote_service}. Aborting.")
             exit(-1)
 
+    # what determines the vectors (and the run journal key): provider, model and endpoint,
+    # never the throughput, retry or cache settings nor the api key
+    if parms.embeddings.local:
+        embedding_identity = {"provider": "sentence_transformer", "model": embed_model_name}
+    else:
+        embedding_service = parms.embeddings.remote_service.replace("_async", "")
+        embedding_identity = {"provider": embedding_service, "model": embed_model_name,
+                              "baseurl": parms.embeddings.get(embedding_service).baseurl}
+
+    from libs.embedding.lazy import LazyEmbeddings
+    embed_func = LazyEmbeddings(embed_factory, model_name=embed_model_name)
+
+    # texts per embedding call, llamaindex caps it at 2048
+    embed_batch_size = int(parms.embeddings.get("embed_batch_size", 2048))
+
+    # persistent embedding cache, shared by the splitter and the indexer
+    cache_path, cache_entries = None, 1000000
+    cache_parms = parms.embeddings.get("cache")
+    if cache_parms is not None and cache_parms.enabled:
+        cache_path = cache_parms.path
+        cache_entries = int(cache_parms.get("max_entries", cache_entries))
+        ttyWriter.print_warning(f"Embedding cache: {cache_path} - max entries: {cache_entries}")
+
+    # incremental ingestion: track ingested files in a manifest next to the persistence dir
+    if parms.chromadb.remote:
+        collection_scope = f"{parms.chromadb.host}:{parms.chromadb.port}/{parms.chromadb.collection}"
+    else:
+        collection_scope = parms.chromadb.collection
+    manifest = None
+    if parms.chromadb.get("manifest") is not None:
+        from libs.loaders.manifest import IngestManifest
+        manifest = IngestManifest(path=parms.chromadb.manifest, scope=collection_scope)
+        ttyWriter.print_warning(f"Incremental ingestion enabled: {manifest}")
+
+    # pipelined ingestion: overlap loading, preparation, splitting, embedding and writing
+    pipeline_workers, pipeline_queue_size = None, 4
+    pipeline_parms = parms.training_data.get("pipeline")
+    if pipeline_parms is not None and pipeline_parms.enabled:
+        pipeline_workers = pipeline_parms.workers.data
+        pipeline_queue_size = int(pipeline_parms.get("queue_size", pipeline_queue_size))
+        ttyWriter.print_warning(f"Pipelined ingestion: workers {pipeline_workers} - queue size {pipeline_queue_size}")
+
+    # hnsw index parameters of the collection
+    hnsw = parms.chromadb.hnsw.data if parms.chromadb.get("hnsw") is not None else None
+    if hnsw is not None:
+        ttyWriter.print_warning(f"HNSW parameters: {hnsw}")
+
+    # node splitter selection
+    splitter = parms.training_data.get("splitter", "semantic")
+    splitter_options = {}
+    if splitter == "semantic_reuse":
+        reuse_parms = parms.training_data.semantic_reuse
+        splitter_options = {"embedding_mode": reuse_parms.embedding_mode,
+                            "reembed_threshold": int(reuse_parms.reembed_threshold)}
+    elif splitter in ("token", "character"):
+        splitter_options = {"chunk_size": int(parms.training_data.chunk_size),
+                            "chunk_overlap": int(parms.training_data.chunk_overlap),
+                            "separator": parms.training_data.separator}
+    ttyWriter.print_warning(f"Node splitter: {splitter} {splitter_options}")
+
+    # corpus statistics: full, sampled or none, optionally persisted as node metadata
+    corpus_stats = {}
+    stats_parms = parms.training_data.get("corpus_stats")
+    if stats_parms is not None:
+        corpus_stats = {"stats": stats_parms.get("mode", "full"),
+                        "sample_rate": float(stats_parms.get("sample_rate", 0.1)),
+                        "workers": int(stats_parms.get("workers", 1)),
+                        "stats_metadata": bool(stats_parms.get("metadata", False))}
+        ttyWriter.print_warning(f"Corpus statistics: {corpus_stats}")
+
+    # near-duplicate chunk detection between the splitter and the writer
+    dedup = None
+    dedup_parms = parms.training_data.get("dedup")
+    if dedup_parms is not None and dedup_parms.enabled:
+        from libs.chroma.dedup import NodeDeduplicator
+        dedup = NodeDeduplicator(threshold=float(dedup_parms.get("threshold", 0.9)),
+                                 num_perm=int(dedup_parms.get("num_perm", 64)),
+                                 shingle_size=int(dedup_parms.get("shingle_size", 3)),
+                                 max_references=int(dedup_parms.get("max_references", 32)))
+        ttyWriter.print_warning(f"Deduplication enabled: {dedup}")
+
+    # sharded ingestion: static path-hash partitioning or a work queue shared by several workers
+    shard, work_queue, worker, claim_size = None, None, None, 16
+    sharding_parms = parms.get("sharding")
+    if sharding_parms is not None and sharding_parms.enabled:
+        from libs.loaders.workqueue import ShardFilter, WorkQueue
+        shards = int(sharding_parms.get("shards", 1))
+        if arguments.shard is not None:
+            shard = ShardFilter(index=arguments.shard, shards=shards)
+        if sharding_parms.mode == "queue":
+            import socket
+            worker = arguments.worker or f"{socket.gethostname()}-{os.getpid()}"
+            claim_size = int(sharding_parms.get("claim_size", claim_size))
+            work_queue = WorkQueue(path=sharding_parms.queue, scope=collection_scope,
+                                   shards=shards, lease=float(sharding_parms.get("lease", 600)),
+                                   max_attempts=int(sharding_parms.get("max_attempts", 3)))
+            ttyWriter.print_warning(f"Sharded ingestion: {work_queue} - worker {worker} - home shard {arguments.shard}")
+            if manifest is not None:
+                # a file may be ingested by a different worker on every run: the manifest
+                # lives in the shared queue database so that every worker sees (and can
+                # delete) the nodes recorded by the others
+                manifest.close()
+                manifest = IngestManifest(path=sharding_parms.queue, scope=collection_scope)
+                ttyWriter.print_warning(f"Incremental ingestion shared by the queue workers: {manifest}")
+        elif shard is not None:
+            ttyWriter.print_warning(f"Sharded ingestion: {shard}")
+        else:
+            ttyWriter.print_error("sharding.mode static requires --shard. Aborting.")
+            exit(1)
+
+    # training_data.sources with per-type parallel loaders, instead of llamaindex.data_path
+    sources, loader_options = None, None
+    loader_parms = parms.training_data.get("loader")
+    if loader_parms is not None and loader_parms.enabled:
+        sources = parms.training_data.sources
+        loader_options = {"pdf_workers": int(loader_parms.get("pdf_workers", 0)),
+                          "pdf_timeout": float(loader_parms.get("pdf_timeout", 120)),
+                          "mmap_threshold": int(loader_parms.get("mmap_threshold", 1 << 20))}
+        ttyWriter.print_warning(f"Source loaders: {[(s.get('data_type'), s.get('path'), s.get('pattern')) for s in sources]} - {loader_options}")
+
+    # run journal: checkpoints committed files so that an interrupted run can be resumed
+    journal = None
+    if parms.training_data.get("journal") is not None:
+        from libs.loaders.journal import IngestJournal, run_key
+        # only an explicit --worker name is part of the key: the hostname-pid default
+        # changes on every run and a resumed run would never find its journal
+        journal_key = run_key({"collection": collection_scope,
+                               "persist_dir": None if parms.chromadb.remote else parms.chromadb.persist_dir,
+                               "data_path": parms.llamaindex.data_path if sources is None else None,
+                               "extensions": parms.llamaindex.extensions if sources is None else None,
+                               "sources": sources,
+                               "embeddings": embedding_identity,
+                               "splitter": splitter,
+                               "splitter_options": splitter_options,
+                               "stats_metadata": corpus_stats.get("stats_metadata", False),
+                               "dedup": dedup_parms.data if dedup is not None else None,
+                               "shard": str(shard) if shard is not None else None,
+                               "worker": arguments.worker})
+        journal = IngestJournal(path=parms.training_data.journal, key=journal_key)
+        if arguments.resume and not journal.resumable():
+            ttyWriter.print_error(f"--resume: no unfinished run with key {journal_key[:12]} in {parms.training_data.journal}, "
+                                  "the configuration changed or the run already finished. Aborting.")
+            for run in journal.runs():
+                ttyWriter.print_warning(f"Journal run {run['key'][:12]}: {run['completed']} files committed - "
+                                        f"{'finished' if run['finished'] is not None else 'unfinished'}")
+            exit(1)
+        completed = journal.start(resume=arguments.resume)
+        if arguments.resume:
+            ttyWriter.print_warning(f"Resuming run: {journal} - {completed} files already committed")
+    elif arguments.resume:
+        ttyWriter.print_error("--resume requires training_data.journal to be set. Aborting.")
+        exit(1)
+
     if parms.chromadb.remote:
         ttyWriter.print_success("Chroma Ingestor: Initializing Remote Client")
         ttyWriter.print_warning(f"Chroma Host: {parms.chromadb.host} - Chroma Port: {parms.chromadb.port}")
@@ -60,19 +318,47 @@ if __name__ == "__main__":
         from libs.chroma.remote_client import LlamaIndexChromaRemote
 
         try:
-            llama_embed_model = LlamaIndexEmbedding(embed_func)
+            llama_embed_model = LlamaIndexEmbedding(embed_func, cache_path=cache_path, cache_entries=cache_entries, embed_batch_size=embed_batch_size)
             cc = LlamaIndexChromaRemote(host=parms.chromadb.host,
                                         port=int(parms.chromadb.port),
                                         collection=parms.chromadb.collection,
                                         collection_similarity=parms.chromadb.collection_similarity,
-                                        embedding_function=llama_embed_model)
+                                        embedding_function=llama_embed_model,
+                                        hnsw=hnsw)
             ttyWriter.print_warning(f"Objects in collection: {cc.Collection().count()}")
-            cc.GenerateEmbeddings(training_data_path=parms.llamaindex.data_path,
-                                  pattern=parms.llamaindex.extensions,
-                                  show_progress=True, batches=parms.training_data.batches)
+            with profiled("main"), metrics.timer("ingest"):
+                cc.GenerateEmbeddings(training_data_path=parms.llamaindex.data_path,
+                                      pattern=parms.llamaindex.extensions,
+                                      show_progress=True, batches=parms.training_data.batches,
+                                      manifest=manifest,
+                                      window_size=int(parms.training_data.get("window_size", 0)),
+                                      pipeline_workers=pipeline_workers,
+                                      queue_size=pipeline_queue_size,
+                                      splitter=splitter,
+                                      splitter_options=splitter_options,
+                                      journal=journal,
+                                      corpus_stats=corpus_stats,
+                                      dedup=dedup,
+                                      shard=shard,
+                                      work_queue=work_queue,
+                                      worker=worker,
+                                      claim_size=claim_size,
+                                      sources=sources,
+                                      loader_options=loader_options)
             ttyWriter.print_warning(f"Objects in collection after ingestion: {cc.Collection().count()}")
+            if metrics_enabled:
+                export_metrics(metrics, metrics_parms, collection=parms.chromadb.collection)
+            if cache_path is not None:
+                ttyWriter.print_success(f"Embedding cache stats: {llama_embed_model.Cache().stats()}")
+            if hasattr(embed_func, "report"):
+                ttyWriter.print_success(f"Embedding throughput: {embed_func.report()}")
         except Exception as e:
             ttyWriter.print_error(f"{e}")
+            if metrics_enabled:
+                export_metrics(metrics, metrics_parms, collection=parms.chromadb.collection)
+            if journal is not None:
+                ttyWriter.print_warning(f"Ingestion interrupted, re-run with --resume to continue from {journal}")
+            exit(1)
     else:
         ttyWriter.print_success("Chroma Ingestor: Initializing Local Client")
         ttyWriter.print_warning(f"[{parms.backend}] Chroma persistence dir: {parms.chromadb.persist_dir}")
@@ -80,15 +366,43 @@ if __name__ == "__main__":
         from libs.chroma.client import LlamaIndexChroma
         from libs.embedding.llamaindex import LlamaIndexEmbedding
         try:
-            llama_embed_model = LlamaIndexEmbedding(embed_func)
+            llama_embed_model = LlamaIndexEmbedding(embed_func, cache_path=cache_path, cache_entries=cache_entries, embed_batch_size=embed_batch_size)
             cc = LlamaIndexChroma(persistence_directory=parms.chromadb.persist_dir,
                                   collection=parms.chromadb.collection,
                                   collection_similarity=parms.chromadb.collection_similarity,
-                                  embedding_function=llama_embed_model)
+                                  embedding_function=llama_embed_model,
+                                  hnsw=hnsw)
             ttyWriter.print_warning(f"Objects in collection: {cc.Collection().count()}")
-            cc.GenerateEmbeddings(training_data_path=parms.llamaindex.data_path,
-                                  pattern=parms.llamaindex.extensions,
-                                  show_progress=True, batches=parms.training_data.batches)
+            with profiled("main"), metrics.timer("ingest"):
+                cc.GenerateEmbeddings(training_data_path=parms.llamaindex.data_path,
+                                      pattern=parms.llamaindex.extensions,
+                                      show_progress=True, batches=parms.training_data.batches,
+                                      manifest=manifest,
+                                      window_size=int(parms.training_data.get("window_size", 0)),
+                                      pipeline_workers=pipeline_workers,
+                                      queue_size=pipeline_queue_size,
+                                      splitter=splitter,
+                                      splitter_options=splitter_options,
+                                      journal=journal,
+                                      corpus_stats=corpus_stats,
+                                      dedup=dedup,
+                                      shard=shard,
+                                      work_queue=work_queue,
+                                      worker=worker,
+                                      claim_size=claim_size,
+                                      sources=sources,
+                                      loader_options=loader_options)
             ttyWriter.print_warning(f"Objects in collection after ingestion: {cc.Collection().count()}")
+            if metrics_enabled:
+                export_metrics(metrics, metrics_parms, collection=parms.chromadb.collection)
+            if cache_path is not None:
+                ttyWriter.print_success(f"Embedding cache stats: {llama_embed_model.Cache().stats()}")
+            if hasattr(embed_func, "report"):
+                ttyWriter.print_success(f"Embedding throughput: {embed_func.report()}")
         except Exception as e:
             ttyWriter.print_error(f"{e}")
+            if metrics_enabled:
+                export_metrics(metrics, metrics_parms, collection=parms.chromadb.collection)
+            if journal is not None:
+                ttyWriter.print_warning(f"Ingestion interrupted, re-run with --resume to continue from {journal}")
+            exit(1)
@@ -8,3 +8,6 @@ pip install --upgrade pip
 # clone repository
 cd $HOME && git clone https://github.com/mcaimi/chromadb-ingestor.git
 pip install -r chromadb-ingestor/requirements.txt
+
+# nltk tokenizer data is not downloaded at runtime, ship it inside the virtualenv (sys.prefix/nltk_data)
+python -m nltk.downloader -d $HOME/.virtualenv/chromadb/nltk_data punkt_tab
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+
+# ChromaDB Ingestor - collection snapshots
+#
+# exports the ids, documents, metadata and vectors of the configured collection to a
+# columnar snapshot directory, or bulk loads a snapshot into the configured (local or
+# remote) collection, so that a collection can be moved or rebuilt with different
+# hnsw parameters without running the embedding pipeline again
+#
+# usage: python snapshot.py -c local.yaml --export ./snapshot [--dtype float16]
+#        python snapshot.py -c remote.yaml --import ./snapshot [--batch-size 5000]
+
+import argparse
+from sys import exit
+from time import perf_counter
+from yaml import safe_load, YAMLError
+from libs.utils.console_utils import ANSIColors
+from libs.utils.parameters import Parameters
+
+
+if __name__ == "__main__":
+    ttyWriter = ANSIColors()
+    parser = argparse.ArgumentParser(prog="ChromaDB Ingestor Snapshots",
+                                     description="Export and import collection snapshots without re-embedding")
+
+    parser.add_argument("-c", "--config_file", action="store", required=True)
+    action = parser.add_mutually_exclusive_group(required=True)
+    action.add_argument("--export", action="store", default=None, metavar="DIRECTORY",
+                        help="dump the configured collection to this snapshot directory")
+    action.add_argument("--import", action="store", default=None, metavar="DIRECTORY", dest="import_",
+                        help="load this snapshot directory into the configured collection")
+    parser.add_argument("--collection", action="store", default=None,
+                        help="override chromadb.collection")
+    parser.add_argument("--dtype", action="store", choices=("float32", "float16"), default="float32",
+                        help="vector precision of the exported snapshot")
+    parser.add_argument("--batch-size", action="store", type=int, default=5000,
+                        help="records read or written per request, capped by the server max batch size")
+    parser.add_argument("--start", action="store", type=int, default=0,
+                        help="continue an interrupted import from this record")
+    arguments = parser.parse_args()
+
+    try:
+        with open(arguments.config_file, "r") as f:
+            parms = Parameters(safe_load(f))
+    except YAMLError as e:
+        ttyWriter.print_error(text=e)
+        exit(1)
+    except Exception as e:
+        ttyWriter.print_error(text=e)
+        exit(1)
+
+    if parms.chromadb.remote:
+        from libs.vectorstore.remote import chroma_client
+        client = chroma_client(host=parms.chromadb.host, port=int(parms.chromadb.port))
+        ttyWriter.print_warning(f"Chroma Host: {parms.chromadb.host} - Chroma Port: {parms.chromadb.port}")
+    else:
+        from chromadb import PersistentClient
+        client = PersistentClient(path=parms.chromadb.persist_dir)
+        ttyWriter.print_warning(f"Chroma persistence dir: {parms.chromadb.persist_dir}")
+    collection_name = arguments.collection or parms.chromadb.collection
+    batch_size = max(min(arguments.batch_size, client.get_max_batch_size()), 1)
+
+    from libs.chroma.snapshot import export_snapshot, import_snapshot, read_manifest
+    started = perf_counter()
+    if arguments.export is not None:
+        try:
+            collection = client.get_collection(collection_name)
+        except Exception as e:
+            ttyWriter.print_error(f"Cannot open collection {collection_name}: {e}")
+            exit(1)
+        ttyWriter.print_success(f"Exporting {collection.count()} records of {collection_name} to {arguments.export}...")
+        manifest = export_snapshot(collection, arguments.export, dtype=arguments.dtype, batch_size=batch_size)
+        elapsed = perf_counter() - started
+        ttyWriter.print_success(f"Exported {manifest['count']} records of {manifest['dimensions']} dimensions ({manifest['dtype']}) in {elapsed:.1f}s")
+    else:
+        try:
+            manifest = read_manifest(arguments.import_)
+        except Exception as e:
+            ttyWriter.print_error(f"Cannot read snapshot {arguments.import_}: {e}")
+            exit(1)
+
+        # the target collection gets the configured similarity and hnsw parameters
+        from libs.chroma.hnsw import open_collection
+        from libs.chroma.writer import ChromaWriter
+        space = parms.chromadb.collection_similarity
+        exported_space = (manifest.get("metadata") or {}).get("hnsw:space")
+        if exported_space is not None and exported_space != space:
+            ttyWriter.print_warning(f"Snapshot of a {exported_space} collection imported into a {space} collection")
+        hnsw = parms.chromadb.hnsw.data if parms.chromadb.get("hnsw") is not None else None
+        collection = open_collection(client, collection_name, space, hnsw=hnsw)
+        writer = ChromaWriter(collection, max_batch_size=client.get_max_batch_size())
+
+        ttyWriter.print_success(f"Importing {manifest['count']} records of {manifest['collection']} into {collection_name}...")
+
+        def progress(done: int):
+            print(f"\r{done}/{manifest['count']} records", end="", flush=True)
+
+        try:
+            imported = import_snapshot(writer, arguments.import_, batch_size=batch_size, start=arguments.start, progress=progress)
+        except Exception as e:
+            print()
+            ttyWriter.print_error(f"{e}")
+            ttyWriter.print_warning(f"Import interrupted after {writer.written} records, re-run with --start {arguments.start + writer.written} to continue")
+            exit(1)
+        print()
+        elapsed = perf_counter() - started
+        ttyWriter.print_success(f"Imported {imported} records in {elapsed:.1f}s ({imported / elapsed if elapsed > 0 else 0.0:.0f} records/s)")
+        ttyWriter.print_warning(f"Objects in collection after import: {collection.count()}")
@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+
+# AsyncHTTPEmbeddings against a local stub ollama server
+import json
+import threading
+from time import sleep, perf_counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from libs.embedding.async_http import AsyncHTTPEmbeddings
+from libs.embedding.llamaindex import LlamaIndexEmbedding
+
+
+# /api/embed stub: the embedding of "t<n>" is [n], every request is recorded.
+# failures is a queue of (status, headers) answered before serving normally,
+# batches larger than max_batch are refused with 413
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, delay: float = 0.0, failures: list = None, max_batch: int = 0):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.delay = delay
+        self.failures = list(failures or [])
+        self.max_batch = max_batch
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.batches = []
+        self.statuses = []
+        self.times = []
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status: int, payload: dict = None, headers: dict = None):
+        body = json.dumps(payload or {}).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        server = self.server
+        texts = json.loads(self.rfile.read(int(self.headers["Content-Length"])))["input"]
+        with server.lock:
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+            server.times.append(perf_counter())
+            failure = server.failures.pop(0) if len(server.failures) > 0 else None
+        try:
+            sleep(server.delay)
+            if failure is not None:
+                status, headers = failure
+            elif server.max_batch > 0 and len(texts) > server.max_batch:
+                status, headers = 413, {}
+            else:
+                status, headers = 200, {}
+            with server.lock:
+                server.statuses.append(status)
+                if status == 200:
+                    server.batches.append(len(texts))
+            self._reply(status, {"embeddings": [[float(t[1:])] for t in texts]} if status == 200 else {}, headers)
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+
+@pytest.fixture
+def stub(request):
+    server = StubServer(**getattr(request, "param", {}))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def client(server: StubServer, **options) -> AsyncHTTPEmbeddings:
+    return AsyncHTTPEmbeddings(base_url=server.url, model="stub", api="ollama", backoff=0.01, **options)
+
+
+def texts(count: int) -> list:
+    return [f"t{n}" for n in range(count)]
+
+
+@pytest.mark.parametrize("stub", [{"delay": 0.05}], indirect=True)
+def test_concurrent_requests_keep_input_order(stub):
+    embedder = client(stub, concurrency=8, batch_size=10, min_batch_size=10, max_batch_size=10)
+    try:
+        vectors = embedder.embed_documents(texts(400))
+    finally:
+        embedder.close()
+    assert vectors == [[float(n)] for n in range(400)]
+    assert len(stub.batches) == 40
+    # requests overlap, never more than the concurrency limit (thread scheduling
+    # may keep the server from seeing all of them in flight at once)
+    assert 1 < stub.max_in_flight <= 8
+
+
+@pytest.mark.parametrize("stub", [{"delay": 0.02}], indirect=True)
+def test_llamaindex_wrapper_reaches_the_client_in_one_call(stub):
+    embedder = client(stub, concurrency=8, batch_size=32, max_batch_size=256)
+    try:
+        vectors = LlamaIndexEmbedding(embedder).get_text_embedding_batch(texts(1000))
+    finally:
+        embedder.close()
+    assert vectors == [[float(n)] for n in range(1000)]
+    assert max(stub.batches) > 10
+    assert stub.max_in_flight > 1
+
+
+@pytest.mark.parametrize("stub", [{"failures": [(429, {"Retry-After": "0.3"}), (503, {})]}], indirect=True)
+def test_retries_honour_retry_after(stub):
+    embedder = client(stub, concurrency=1, batch_size=4)
+    try:
+        vectors = embedder.embed_documents(texts(4))
+    finally:
+        embedder.close()
+    assert vectors == [[float(n)] for n in range(4)]
+    assert stub.statuses == [429, 503, 200]
+    assert embedder.retries == 2
+    # the second attempt waited for Retry-After
+    assert stub.times[1] - stub.times[0] >= 0.3
+
+
+@pytest.mark.parametrize("stub", [{"failures": [(500, {})] * 3}], indirect=True)
+def test_retries_give_up_after_max_retries(stub):
+    from libs.embedding.async_http import EmbeddingRequestError
+    embedder = client(stub, concurrency=1, batch_size=4, max_retries=2)
+    try:
+        with pytest.raises(EmbeddingRequestError):
+            embedder.embed_documents(texts(4))
+    finally:
+        embedder.close()
+    assert stub.statuses == [500, 500, 500]
+
+
+@pytest.mark.parametrize("stub", [{"max_batch": 8}], indirect=True)
+def test_payload_too_large_splits_and_shrinks(stub):
+    embedder = client(stub, concurrency=1, batch_size=32, max_batch_size=64)
+    try:
+        vectors = embedder.embed_documents(texts(100))
+    finally:
+        embedder.close()
+    assert vectors == [[float(n)] for n in range(100)]
+    assert max(stub.batches) <= 8
+    assert embedder.report()["batch_size"] < 32
+
+
+@pytest.mark.parametrize("stub", [{"delay": 0.1}], indirect=True)
+def test_slow_responses_shrink_the_batch(stub):
+    embedder = client(stub, concurrency=1, batch_size=32, min_batch_size=2, target_latency=0.02)
+    try:
+        embedder.embed_documents(texts(64))
+    finally:
+        embedder.close()
+    assert embedder.report()["batch_size"] == 2
+    assert stub.batches[0] == 32 and stub.batches[-1] < 32
+
+
+def test_fast_responses_grow_the_batch(stub):
+    embedder = client(stub, concurrency=1, batch_size=4, max_batch_size=64, target_latency=1.0)
+    try:
+        embedder.embed_documents(texts(1000))
+    finally:
+        embedder.close()
+    assert embedder.report()["batch_size"] == 64
+    assert stub.batches[0] == 4 and max(stub.batches) == 64
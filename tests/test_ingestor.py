@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+
+# incremental ingestion into a local chromadb collection: duplicates of changed
+# canonical chunks and journal resumes, with a deterministic fake embedding model
+import pytest
+from libs.chroma.client import LlamaIndexChroma
+from libs.chroma.dedup import NodeDeduplicator
+from libs.loaders.manifest import IngestManifest
+from libs.loaders.journal import IngestJournal
+from benchmarks.fake_embedding import FakeEmbedding
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    path = tmp_path / "corpus"
+    path.mkdir()
+    return path
+
+
+@pytest.fixture
+def ingestor(tmp_path):
+    return LlamaIndexChroma(persistence_directory=str(tmp_path / "chroma"),
+                            collection="test",
+                            collection_similarity="cosine",
+                            embedding_function=FakeEmbedding(dimensions=8))
+
+
+def ingest(ingestor: LlamaIndexChroma, corpus, **kwargs):
+    ingestor.GenerateEmbeddings(training_data_path=str(corpus),
+                                show_progress=False,
+                                splitter="character",
+                                splitter_options={"chunk_size": 200, "chunk_overlap": 0},
+                                corpus_stats={"stats": "none"},
+                                **kwargs)
+
+
+def documents(ingestor: LlamaIndexChroma) -> dict:
+    rows = ingestor.Collection().get(include=["documents", "metadatas"])
+    return {document: metadata for document, metadata in zip(rows["documents"], rows["metadatas"])}
+
+
+def test_duplicates_are_ingested_again_when_their_canonical_changes(ingestor, corpus, tmp_path):
+    (corpus / "a.txt").write_text("the same paragraph in both files")
+    (corpus / "b.txt").write_text("the same paragraph in both files")
+    manifest = IngestManifest(path=str(tmp_path / "manifest.sqlite"), scope="test")
+    try:
+        ingest(ingestor, corpus, manifest=manifest, dedup=NodeDeduplicator(threshold=1.0))
+        found = documents(ingestor)
+        assert list(found.keys()) == ["the same paragraph in both files"]
+        assert found["the same paragraph in both files"]["duplicate_count"] == 1
+
+        # the canonical chunk changes: the dropped duplicate must come back
+        (corpus / "a.txt").write_text("a different paragraph now")
+        ingest(ingestor, corpus, manifest=manifest, dedup=NodeDeduplicator(threshold=1.0))
+        found = documents(ingestor)
+        assert sorted(found.keys()) == ["a different paragraph now", "the same paragraph in both files"]
+        assert found["the same paragraph in both files"]["file_path"] == str(corpus / "b.txt")
+        assert all("duplicate_count" not in metadata for metadata in found.values())
+
+        # nothing changed: nothing is ingested again
+        ingest(ingestor, corpus, manifest=manifest, dedup=NodeDeduplicator(threshold=1.0))
+        assert len(documents(ingestor)) == 2
+    finally:
+        manifest.close()
+
+
+def test_removed_file_nodes_are_deleted(ingestor, corpus, tmp_path):
+    (corpus / "a.txt").write_text("first file")
+    (corpus / "b.txt").write_text("second file")
+    manifest = IngestManifest(path=str(tmp_path / "manifest.sqlite"), scope="test")
+    try:
+        ingest(ingestor, corpus, manifest=manifest)
+        assert ingestor.Collection().count() == 2
+        (corpus / "b.txt").unlink()
+        ingest(ingestor, corpus, manifest=manifest)
+        assert list(documents(ingestor).keys()) == ["first file"]
+    finally:
+        manifest.close()
+
+
+def test_resume_skips_committed_files(ingestor, corpus, tmp_path):
+    for name in ("a", "b", "c"):
+        (corpus / f"{name}.txt").write_text(f"contents of {name}")
+    journal = IngestJournal(path=str(tmp_path / "journal.sqlite"), key="run")
+    try:
+        # an interrupted run that committed a.txt
+        journal.start()
+        journal.mark([str(corpus / "a.txt")], {str(corpus / "a.txt"): 1})
+        assert journal.resumable()
+
+        journal.start(resume=True)
+        ingest(ingestor, corpus, journal=journal)
+        assert sorted(documents(ingestor).keys()) == ["contents of b", "contents of c"]
+        assert journal.completed() == {str(corpus / f"{name}.txt") for name in ("a", "b", "c")}
+        assert journal.finished() and not journal.resumable()
+
+        # a fresh run starts over
+        journal.start()
+        assert journal.completed() == set()
+    finally:
+        journal.close()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+
+# IngestManifest diff, invalidation and duplicate tracking
+import os
+import pytest
+from libs.loaders.manifest import IngestManifest
+
+
+@pytest.fixture
+def manifest(tmp_path):
+    m = IngestManifest(path=str(tmp_path / "manifest.sqlite"), scope="test")
+    yield m
+    m.close()
+
+
+def write(path, text: str) -> str:
+    path.write_text(text)
+    return str(path)
+
+
+def record(manifest: IngestManifest, changed: dict, path: str, node_ids: list, duplicates: list = []):
+    manifest.record(path, *changed[path], node_ids, duplicates)
+
+
+def test_diff_reports_new_modified_and_removed_files(manifest, tmp_path):
+    a = write(tmp_path / "a.txt", "alpha")
+    b = write(tmp_path / "b.txt", "beta")
+    changed, removed = manifest.diff([a, b])
+    assert set(changed) == {a, b} and removed == []
+    record(manifest, changed, a, ["a0"])
+    record(manifest, changed, b, ["b0"])
+
+    assert manifest.diff([a, b]) == ({}, [])
+
+    write(tmp_path / "a.txt", "alpha, modified")
+    os.remove(b)
+    changed, removed = manifest.diff([a])
+    assert list(changed) == [a]
+    assert removed == [b]
+    assert manifest.node_ids([b]) == ["b0"]
+
+    manifest.forget(removed)
+    assert manifest.diff([a])[1] == []
+    assert manifest.node_ids([b]) == []
+
+
+def test_touched_file_with_identical_content_is_unchanged(manifest, tmp_path):
+    a = write(tmp_path / "a.txt", "alpha")
+    changed, _ = manifest.diff([a])
+    record(manifest, changed, a, ["a0"])
+    st = os.stat(a)
+    os.utime(a, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    assert manifest.diff([a]) == ({}, [])
+
+
+def test_invalidated_file_is_changed_and_keeps_its_nodes(manifest, tmp_path):
+    a = write(tmp_path / "a.txt", "alpha")
+    changed, _ = manifest.diff([a])
+    record(manifest, changed, a, ["a0", "a1"])
+
+    manifest.invalidate([a])
+    changed, removed = manifest.diff([a])
+    assert list(changed) == [a] and removed == []
+    # the previous nodes are still known, so that they can be replaced
+    assert manifest.node_ids([a]) == ["a0", "a1"]
+
+
+def test_duplicates_point_back_to_their_files(manifest, tmp_path):
+    a = write(tmp_path / "a.txt", "alpha")
+    b = write(tmp_path / "b.txt", "beta")
+    c = write(tmp_path / "c.txt", "gamma")
+    changed, _ = manifest.diff([a, b, c])
+    record(manifest, changed, a, ["a0", "a1"])
+    record(manifest, changed, b, ["b0"], [("a0", f"{b}:10-20")])
+    record(manifest, changed, c, ["c0"], [("a0", f"{c}:0-10"), ("b0", f"{c}:10-20")])
+
+    assert manifest.dependents(["a0"]) == sorted([b, c])
+    assert manifest.dependents(["a1"]) == []
+    assert manifest.canonicals([c]) == {"a0", "b0"}
+    assert manifest.references(["a0", "a1"]) == {"a0": (2, [f"{b}:10-20", f"{c}:0-10"]), "a1": (0, [])}
+
+    # recording a file again replaces its duplicates, forgetting it drops them
+    record(manifest, changed, b, ["b0"])
+    assert manifest.dependents(["a0"]) == [c]
+    manifest.forget([c])
+    assert manifest.dependents(["a0", "b0"]) == []
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+
+# WorkQueue claims, leases, attempts and requeueing
+from time import sleep
+import pytest
+from libs.loaders.workqueue import WorkQueue
+
+
+@pytest.fixture
+def files(tmp_path):
+    paths = []
+    for n in range(4):
+        path = tmp_path / f"f{n}.txt"
+        path.write_text(f"file {n}")
+        paths.append(str(path))
+    return paths
+
+
+@pytest.fixture
+def queue(tmp_path):
+    q = WorkQueue(path=str(tmp_path / "queue.sqlite"), scope="test", lease=0.2, max_attempts=2)
+    yield q
+    q.close()
+
+
+def states(queue: WorkQueue) -> dict:
+    totals = {"pending": 0, "claimed": 0, "done": 0, "failed": 0}
+    for counts in queue.progress().values():
+        for state, count in counts.items():
+            totals[state] += count
+    return totals
+
+
+def test_claims_are_disjoint_until_completed(queue, files):
+    assert queue.populate(files) == 4
+    first = queue.claim("a", limit=3)
+    second = queue.claim("b", limit=3)
+    assert len(first) == 3 and len(second) == 1
+    assert set(first).isdisjoint(second)
+    queue.complete("a", first)
+    queue.complete("b", second)
+    assert states(queue)["done"] == 4
+    assert queue.claim("c") == []
+
+
+def test_expired_claims_are_handed_out_again(queue, files):
+    queue.populate(files)
+    claimed = queue.claim("a", limit=4)
+    assert queue.claim("b") == []
+    sleep(0.3)
+    assert sorted(queue.claim("b", limit=4)) == sorted(claimed)
+
+
+def test_claims_fail_after_max_attempts(queue, files):
+    queue.populate(files[:1])
+    assert queue.claim("a") == files[:1]
+    sleep(0.3)
+    assert queue.claim("b") == files[:1]
+    sleep(0.3)
+    assert queue.claim("c") == []
+    assert queue.failed() == files[:1]
+    assert states(queue)["failed"] == 1
+
+    assert queue.retry_failed() == 1
+    assert queue.claim("d") == files[:1]
+
+
+def test_rebalance_releases_or_fails_stale_claims(queue, files):
+    queue.populate(files[:2])
+    queue.claim("a", limit=1)
+    assert queue.rebalance(workers=["a"]) == 1
+    queue.claim("a", limit=2)
+    # the first file used its two attempts, the second one is released
+    assert queue.rebalance(lease=0) == 2
+    assert states(queue) == {"pending": 1, "claimed": 0, "done": 0, "failed": 1}
+
+
+def test_heartbeat_keeps_claims_alive(queue, files):
+    queue.populate(files)
+    queue.claim("a", limit=4)
+    queue.start_heartbeat("a", interval=0.05)
+    try:
+        sleep(0.5)
+        assert queue.claim("b") == []
+    finally:
+        queue.stop_heartbeat()
+    sleep(0.3)
+    assert len(queue.claim("b", limit=4)) == 4
+
+
+def test_requeue_and_modified_files(queue, files):
+    queue.populate(files)
+    queue.complete("a", queue.claim("a", limit=4))
+
+    # unchanged files are not queued again, modified ones are
+    assert queue.populate(files) == 0
+    with open(files[0], "a") as f:
+        f.write(", modified")
+    assert queue.populate(files) == 1
+    assert queue.claim("b", limit=4) == files[:1]
+
+    # requeue forces unchanged files back, but never steals a live claim
+    assert queue.requeue(files) == 3
+    assert sorted(queue.claim("c", limit=4)) == sorted(files[1:])